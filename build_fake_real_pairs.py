@@ -52,8 +52,9 @@ class CheckpointManager:
         """Save checkpoint to file."""
         self.checkpoint_data["last_update_time"] = time.time()
         try:
+            # Saved after every batch: compact separators, no indentation
             with open(self.checkpoint_path, 'w') as f:
-                json.dump(self.checkpoint_data, f, indent=2)
+                json.dump(self.checkpoint_data, f, separators=(',', ':'))
         except Exception as e:
             print(f"Warning: Could not save checkpoint: {e}")
     
@@ -170,7 +171,7 @@ def build_fake_real_pairs(
         resume: Resume from previous checkpoint
         clean: Clear previous checkpoint and start fresh
         batch_size: Batch size for feature extraction
-        num_threads: Number of threads for FAISS search
+        num_threads: Number of search threads (FAISS and torch)
     """
     
     print("="*70)
@@ -419,7 +420,7 @@ Examples:
         "--threads", "-t",
         type=int,
         default=8,
-        help="Number of threads for FAISS search (default: 8)"
+        help="Number of search threads, FAISS and torch (default: 8)"
     )
     
     parser.add_argument(
@@ -1,7 +1,7 @@
 import argparse
 import sys
 from src.database import init_db, get_stats
-from src.scanner import scan_directory
+from src.scanner import scan_directory, SCAN_WORKERS
 from src.processor import process_images
 from src.search import SearchEngine
 
@@ -15,12 +15,19 @@ def main():
     # Scan command
     parser_scan = subparsers.add_parser("scan", help="Scan directory for images")
     parser_scan.add_argument("path", help="Root directory to scan")
+    parser_scan.add_argument("--workers", type=int, default=SCAN_WORKERS,
+                             help=f"Threads listing directories in parallel (default: {SCAN_WORKERS})")
     
     # Process command
     parser_process = subparsers.add_parser("process", help="Process pending images (extract features)")
     
     # Build-index command
     parser_build = subparsers.add_parser("build-index", help="Build FAISS search index from database")
+    parser_build.add_argument("--quantize", nargs="?", const="sq8", choices=["sq8", "fp16"],
+                              help="Store scalar-quantized vectors in the index: sq8 (default, 4x smaller) or fp16 (2x smaller)")
+    index_type = parser_build.add_mutually_exclusive_group()
+    index_type.add_argument("--ivfpq", action="store_true", help="Build an approximate OPQ+IVF+PQ index for large collections")
+    index_type.add_argument("--hnsw", action="store_true", help="Build an approximate HNSW index for large collections (default: exact search)")
     
     # Search command
     parser_search = subparsers.add_parser("search", help="Search for similar images")
@@ -31,6 +38,8 @@ def main():
     parser_stats = subparsers.add_parser("stats", help="Show system statistics")
     
     args = parser.parse_args()
+    if args.command == "build-index" and args.ivfpq and args.quantize:
+        parser_build.error("--quantize cannot be combined with --ivfpq (IVF-PQ stores its own compressed codes)")
     
     if args.command == "init":
         init_db()
@@ -38,14 +47,14 @@ def main():
         
     elif args.command == "scan":
         init_db() # Ensure DB exists
-        scan_directory(args.path)
+        scan_directory(args.path, num_workers=args.workers)
         
     elif args.command == "process":
         process_images()
         
     elif args.command == "build-index":
         engine = SearchEngine()
-        if engine.build_index():
+        if engine.build_index(quantize=args.quantize, ivfpq=args.ivfpq, hnsw=args.hnsw):
             engine.save_index()
             print("FAISS index built and saved successfully.")
         else:
@@ -76,7 +85,7 @@ def main():
         import os
         import numpy as np
         from src.config import DB_PATH
-        from src.database import get_connection
+        from src.database import get_connection, close_connection, get_feature
         
         print("=== Database Status Inspection ===")
         
@@ -112,27 +121,25 @@ def main():
         cursor = conn.cursor()
         
         try:
-            # Get one random feature
+            # Get one random processed image
             cursor.execute("""
-                SELECT i.id, i.path, f.vector 
-                FROM features f 
-                JOIN images i ON f.image_id = i.id 
+                SELECT id, path 
+                FROM images 
+                WHERE status = 1 
                 ORDER BY RANDOM() 
                 LIMIT 1
             """)
             row = cursor.fetchone()
+            vector = get_feature(row[0]) if row else None
             
-            if not row:
+            if vector is None:
                 print("No features found in the database.")
                 return
                 
-            image_id, path, vector_blob = row
+            image_id, path = row
             print(f"Sampled Image ID: {image_id}")
             print(f"Path: {path}")
-            print(f"Blob size: {len(vector_blob)} bytes")
-            
-            # Deserialize
-            vector = np.frombuffer(vector_blob, dtype=np.float32)
+            print(f"Vector size: {vector.nbytes} bytes")
             
             print(f"Vector shape: {vector.shape}")
             print(f"Vector dtype: {vector.dtype}")
@@ -151,7 +158,7 @@ def main():
         except Exception as e:
             print(f"Error sampling feature: {e}")
         finally:
-            conn.close()
+            close_connection()
         
     else:
         parser.print_help()
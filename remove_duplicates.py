@@ -266,10 +266,12 @@ def remove_duplicates(input_dir, threshold=THRESHOLD, dry_run=DRY_RUN,
             if group_info['remove']:
                 print(f"  待删除文件：")
                 for f in group_info['remove']:
-                    file_size = 0
-                    if os.path.exists(f):
-                        file_size = os.path.getsize(f)
-                        total_space += file_size
+                    # 一次 stat 同时得到是否存在与文件大小
+                    try:
+                        file_size = os.stat(f).st_size
+                    except OSError:
+                        file_size = 0
+                    total_space += file_size
                     
                     size_str = f"{file_size / 1024 / 1024:.2f} MB" if file_size > 0 else "0 B"
                     
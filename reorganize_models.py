@@ -18,10 +18,11 @@
 }
 """
 
+import argparse
 import json
 import shutil
+import stat
 import sys
-import subprocess
 import os
 from pathlib import Path
 from collections import defaultdict
@@ -29,6 +30,32 @@ from collections import defaultdict
 from tqdm import tqdm
 
 
+# 文件复制引擎：auto 在启动时探测一次当前平台可用的最快方式并缓存
+COPY_ENGINES = ('auto', 'copy_file_range', 'sendfile', 'copyfileobj')
+
+
+def _detect_copy_engine():
+    if hasattr(os, 'copy_file_range'):
+        return 'copy_file_range'
+    if hasattr(os, 'sendfile'):
+        return 'sendfile'
+    return 'copyfileobj'
+
+
+AUTO_COPY_ENGINE = _detect_copy_engine()
+_copy_engine = AUTO_COPY_ENGINE
+
+
+def set_copy_engine(engine):
+    """
+    选择文件复制引擎（COPY_ENGINES 之一），auto 使用启动时探测的结果。
+    """
+    global _copy_engine
+    if engine not in COPY_ENGINES:
+        raise ValueError(f"未知的复制引擎: {engine}")
+    _copy_engine = AUTO_COPY_ENGINE if engine == 'auto' else engine
+
+
 def load_merge_rules(rules_file):
     with open(rules_file, 'r', encoding='utf-8') as f:
         rules = json.load(f)
@@ -36,16 +63,142 @@ def load_merge_rules(rules_file):
 
 
 def count_items_in_folder(folder_path):
-    return len(list(folder_path.iterdir()))
+    with os.scandir(folder_path) as it:
+        return sum(1 for _ in it)
 
 
-def copy_folder_contents(src_dir, dest_dir):
+def _copy_file_data(src_file, dest_file):
     """
-    使用系统 cp 命令将源文件夹中的所有内容复制到目标文件夹，保留符号链接。
+    在内核中复制文件内容（os.copy_file_range / os.sendfile，由当前复制引擎决定），
+    不支持时回退到普通读写。
+
+    Args:
+        src_file: 源文件路径
+        dest_file: 目标文件路径
+    """
+    with open(src_file, 'rb') as fsrc, open(dest_file, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+            if _copy_engine == 'copy_file_range':
+                while offset < size:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset,
+                                                offset, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+            elif _copy_engine == 'sendfile':
+                while offset < size:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+        except (AttributeError, OSError):
+            # 当前平台/文件系统不支持该引擎，从已复制的位置继续
+            pass
+        if offset < size:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst)
+
+
+def _copy_entry(entry, dest_item):
+    """
+    复制单个目录项（等价于 cp -P）：符号链接原样重建，普通文件复制内容并保留权限位和时间戳。
+
+    Args:
+        entry: 源 os.DirEntry
+        dest_item: 目标路径
+    """
+    if entry.is_symlink():
+        if os.path.lexists(dest_item):
+            os.unlink(dest_item)
+        os.symlink(os.readlink(entry.path), dest_item)
+    else:
+        st = entry.stat()
+        _copy_file_data(entry.path, dest_item)
+        os.chmod(dest_item, stat.S_IMODE(st.st_mode))
+        os.utime(dest_item, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def _check_copy_target(src_dir, dest_dir):
+    """
+    拒绝把目录复制到自身或其子目录中（与 cp 的行为一致）。
+    """
+    src_real = os.path.realpath(src_dir)
+    dest_real = os.path.realpath(dest_dir)
+    if dest_real == src_real or dest_real.startswith(src_real + os.sep):
+        raise OSError(f"无法将目录 '{src_dir}' 复制到自身 '{dest_dir}' 中")
+
+
+def _make_dir(path, created_dirs):
+    """
+    创建目录，已记录在 created_dirs 中的路径直接跳过。
+    """
+    if path in created_dirs:
+        return
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+    created_dirs.add(path)
+
+
+def _fast_copytree(src_dir, dest_dir, created_dirs=None):
+    """
+    使用 os.scandir 递归复制目录（等价于 cp -P -r），保留符号链接。
+
+    单次遍历完成目录创建和文件复制，不再为每个条目启动一个 cp 进程。
+    与 cp 一样，单个条目出错时记录错误并继续复制其余内容。
+
+    Args:
+        src_dir: 源文件夹路径
+        dest_dir: 目标文件夹路径
+        created_dirs: 已创建的目标目录集合，多个源合并到同一目标时共享以跳过重复的 mkdir
+
+    Returns:
+        list: 失败列表（"路径: 错误"）
+    """
+    if created_dirs is None:
+        created_dirs = set()
+
+    _check_copy_target(src_dir, dest_dir)
+    if str(dest_dir) not in created_dirs:
+        os.makedirs(dest_dir, exist_ok=True)
+        created_dirs.add(str(dest_dir))
+
+    fail_list = []
+    stack = [(str(src_dir), str(dest_dir))]
+    while stack:
+        src, dest = stack.pop()
+        try:
+            with os.scandir(src) as it:
+                entries = list(it)
+        except OSError as e:
+            fail_list.append(f"{src}: {e}")
+            continue
+        for entry in entries:
+            dest_item = os.path.join(dest, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    _make_dir(dest_item, created_dirs)
+                    stack.append((entry.path, dest_item))
+                else:
+                    _copy_entry(entry, dest_item)
+            except OSError as e:
+                fail_list.append(f"{entry.path}: {e}")
+
+    return fail_list
+
+
+def copy_folder_contents(src_dir, dest_dir, created_dirs=None):
+    """
+    将源文件夹中的所有内容复制到目标文件夹，保留符号链接。
     
     Args:
         src_dir: 源文件夹路径
         dest_dir: 目标文件夹路径
+        created_dirs: 已创建的目标目录集合（由调用方创建目标文件夹时登记）
 
     Returns:
         tuple: (成功数, 失败数, 失败列表)
@@ -56,26 +209,33 @@ def copy_folder_contents(src_dir, dest_dir):
     if not src_path.exists():
         return 0, 0, []
 
-    try:
-        items = list(src_path.iterdir())
-        item_count = len(items)
-        
-        if item_count == 0:
-            return 0, 0, []
-
-        dest_path.mkdir(parents=True, exist_ok=True)
+    if created_dirs is None:
+        created_dirs = set()
 
-        # 使用 find + xargs + cp 保留符号链接
-        # -P 选项保留符号链接，-r 递归复制
-        cmd = f'find "{src_path}" -maxdepth 1 ! -name . -print0 | xargs -0 -I {{}} cp -P -r {{}} "{dest_path}/"'
-        
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return item_count, 0, []
-        else:
-            error_msg = result.stderr.strip() if result.stderr else "Unknown error"
-            return 0, item_count, [error_msg]
+    try:
+        _check_copy_target(src_path, dest_path)
+        if str(dest_path) not in created_dirs:
+            dest_path.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(str(dest_path))
+
+        success = 0
+        fail_list = []
+        with os.scandir(src_path) as it:
+            for entry in it:
+                dest_item = os.path.join(dest_path, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        tree_fail_list = _fast_copytree(entry.path, dest_item, created_dirs)
+                        if tree_fail_list:
+                            fail_list.extend(tree_fail_list)
+                            continue
+                    else:
+                        _copy_entry(entry, dest_item)
+                    success += 1
+                except OSError as e:
+                    fail_list.append(f"{entry.path}: {e}")
+
+        return success, len(fail_list), fail_list
 
     except Exception as e:
         print(f"警告：复制文件夹 {src_dir} 时出错: {e}")
@@ -84,7 +244,10 @@ def copy_folder_contents(src_dir, dest_dir):
 
 def move_folder_contents(src_dir, dest_dir):
     """
-    使用系统 mv 命令将源文件夹中的所有内容移动到目标文件夹，保留符号链接。
+    将源文件夹中的所有内容移动到目标文件夹，保留符号链接。
+
+    源和目标位于同一文件系统时直接使用 os.replace（单次 rename），
+    否则回退到 shutil.move。
     
     Args:
         src_dir: 源文件夹路径
@@ -100,24 +263,24 @@ def move_folder_contents(src_dir, dest_dir):
         return 0, 0, []
 
     try:
-        items = list(src_path.iterdir())
-        item_count = len(items)
-        
-        if item_count == 0:
-            return 0, 0, []
-
         dest_path.mkdir(parents=True, exist_ok=True)
-
-        # 使用 find + xargs + mv
-        cmd = f'find "{src_path}" -maxdepth 1 ! -name . -print0 | xargs -0 -I {{}} mv {{}} "{dest_path}/"'
-        
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return item_count, 0, []
-        else:
-            error_msg = result.stderr.strip() if result.stderr else "Unknown error"
-            return 0, item_count, [error_msg]
+        same_device = os.stat(src_path).st_dev == os.stat(dest_path).st_dev
+
+        success = 0
+        fail_list = []
+        with os.scandir(src_path) as it:
+            for entry in it:
+                dest_item = os.path.join(dest_path, entry.name)
+                try:
+                    if same_device:
+                        os.replace(entry.path, dest_item)
+                    else:
+                        shutil.move(entry.path, dest_item)
+                    success += 1
+                except (OSError, shutil.Error) as e:
+                    fail_list.append(f"{entry.path}: {e}")
+
+        return success, len(fail_list), fail_list
 
     except Exception as e:
         print(f"警告：移动文件夹 {src_dir} 时出错: {e}")
@@ -126,32 +289,32 @@ def move_folder_contents(src_dir, dest_dir):
 
 def cleanup_empty_folders(root_dir, max_depth=5):
     """
-    删除空文件夹（递归）。
+    删除空文件夹（自底向上，不删除根目录本身）。
+
+    用 os.walk 收集 max_depth 层以内的目录（更深处不再遍历），再逆序处理，
+    子目录先于父目录；直接尝试 rmdir，非空目录会失败并被忽略，无需再次列出目录内容。
 
     Args:
         root_dir: 根目录路径
-        max_depth: 最大递归深度
+        max_depth: 最大递归深度（可删除根目录下第 1 到 max_depth + 1 层的目录）
     """
-    root_path = Path(root_dir)
+    root_dir = os.path.abspath(root_dir)
+    root_depth = root_dir.rstrip(os.sep).count(os.sep)
 
-    def remove_empty_dirs(path, depth=0):
+    candidates = []
+    for dirpath, dirnames, _ in os.walk(root_dir):
+        depth = dirpath.count(os.sep) - root_depth
         if depth > max_depth:
-            return
+            dirnames.clear()
+        if depth > 0:
+            candidates.append(dirpath)
 
+    for dirpath in reversed(candidates):
         try:
-            for item in path.iterdir():
-                if item.is_dir():
-                    remove_empty_dirs(item, depth + 1)
-                    try:
-                        if not list(item.iterdir()):
-                            item.rmdir()
-                    except OSError:
-                        pass
-        except (OSError, PermissionError):
+            os.rmdir(dirpath)
+        except OSError:
             pass
 
-    remove_empty_dirs(root_path)
-
 
 def reorganize_models(source_dir, rules_file, output_dir=None, dry_run=False):
     """
@@ -190,10 +353,11 @@ def reorganize_models(source_dir, rules_file, output_dir=None, dry_run=False):
     print(f"已加载 {len(merge_rules)} 条合并规则\n")
 
     # 建立反向映射：原文件夹 -> 目标文件夹
-    original_to_target = {}
-    for target_name, original_list in merge_rules.items():
-        for original_name in original_list:
-            original_to_target[original_name] = target_name
+    original_to_target = {
+        original_name: target_name
+        for target_name, original_list in merge_rules.items()
+        for original_name in original_list
+    }
 
     # 扫描源目录
     print(f"正在扫描源目录: {source_dir}")
@@ -207,21 +371,15 @@ def reorganize_models(source_dir, rules_file, output_dir=None, dry_run=False):
     # 分类文件夹
     to_merge = defaultdict(list)  # {目标文件夹: [原文件夹路径]}
     to_keep = []  # 不需要合并的文件夹
-    missing = set()  # 规则中指定但不存在的文件夹
+    merged_names = set(original_to_target).intersection(existing_folders)
+    missing = set(original_to_target).difference(existing_folders)  # 规则中指定但不存在的文件夹
 
     for original_name, folder_path in existing_folders.items():
-        if original_name in original_to_target:
-            target_name = original_to_target[original_name]
-            to_merge[target_name].append((original_name, folder_path))
+        if original_name in merged_names:
+            to_merge[original_to_target[original_name]].append((original_name, folder_path))
         else:
             to_keep.append((original_name, folder_path))
 
-    # 检查规则中缺失的文件夹
-    for target_name, original_list in merge_rules.items():
-        for original_name in original_list:
-            if original_name not in existing_folders:
-                missing.add(original_name)
-
     # 打印统计信息
     print("=" * 70)
     print("重排计划摘要")
@@ -282,15 +440,19 @@ def reorganize_models(source_dir, rules_file, output_dir=None, dry_run=False):
     total_fail = 0
     all_fail_items = []
 
+    # 已创建的目标目录，多个原文件夹合并到同一目标时避免重复 mkdir
+    created_dirs = set()
+
     with tqdm(total=len(to_merge) + len(to_keep), desc="处理进度", unit="组") as pbar:
         # 处理需要合并的文件夹
         for target_name, original_folders in to_merge.items():
             target_path = work_path / target_name
             target_path.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(str(target_path))
 
             for original_name, original_path in original_folders:
                 # 始终使用复制操作，不删除任何源文件
-                success, fail, fail_list = copy_folder_contents(str(original_path), str(target_path))
+                success, fail, fail_list = copy_folder_contents(str(original_path), str(target_path), created_dirs)
                 total_success += success
                 total_fail += fail
                 all_fail_items.extend(fail_list)
@@ -301,15 +463,14 @@ def reorganize_models(source_dir, rules_file, output_dir=None, dry_run=False):
         for original_name, folder_path in to_keep:
             dest_folder = work_path / original_name
             try:
-                # 使用 cp -P -r 保留符号链接并递归复制整个文件夹
-                cmd = 'cp -P -r "{}" "{}"'.format(folder_path, dest_folder)
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-                if result.returncode == 0:
-                    total_success += count_items_in_folder(folder_path)
-                else:
-                    error_msg = result.stderr.strip() if result.stderr else "Unknown error"
-                    total_fail += 1
-                    all_fail_items.append("复制文件夹 {} 失败: {}".format(original_name, error_msg))
+                # 保留符号链接并递归复制整个文件夹；出错的条目单独记录，其余内容照常复制
+                fail_list = _fast_copytree(folder_path, dest_folder, created_dirs)
+                total_success += count_items_in_folder(folder_path)
+                total_fail += len(fail_list)
+                all_fail_items.extend(fail_list)
+            except OSError as e:
+                total_fail += 1
+                all_fail_items.append("复制文件夹 {} 失败: {}".format(original_name, str(e)))
             except Exception as e:
                 total_fail += 1
                 all_fail_items.append("复制文件夹 {} 异常: {}".format(original_name, str(e)))
@@ -340,49 +501,56 @@ def reorganize_models(source_dir, rules_file, output_dir=None, dry_run=False):
 
 
 def main():
-    if len(sys.argv) < 3:
-        print("使用方法: python3 reorganize_models.py <source_dir> <rules_file> [options]")
-        print()
-        print("参数说明:")
-        print("  source_dir: 源目录路径（如 ./sd1.5）")
-        print("  rules_file: 合并规则JSON文件路径（如 ./merge_rules.json）")
-        print()
-        print("可选参数:")
-        print("  --output <dir>  输出目录。指定时，重排结果将放在此目录，源文件保持不动")
-        print("                  不指定时，使用源目录本身（仍然保留原始文件，使用复制模式）")
-        print("  --dry-run       仅显示将要执行的操作，不实际执行")
-        print()
-        print("示例:")
-        print("  # 在新目录中输出重排结果（推荐，源文件完全保留）")
-        print("  python3 reorganize_models.py ./sd1.5 ./merge_rules.json --output ./sd1.5_organized")
-        print()
-        print("  # 在源目录中输出，但保留原始文件")
-        print("  python3 reorganize_models.py ./sd1.5 ./merge_rules.json")
-        print()
-        print("  # Dry run 模式")
-        print("  python3 reorganize_models.py ./sd1.5 ./merge_rules.json --dry-run")
-        sys.exit(1)
-
-    source_dir = sys.argv[1]
-    rules_file = sys.argv[2]
-
-    # 解析可选参数
-    output_dir = None
-    dry_run = False
-
-    i = 3
-    while i < len(sys.argv):
-        if sys.argv[i] == '--output' and i + 1 < len(sys.argv):
-            output_dir = sys.argv[i + 1]
-            i += 2
-        elif sys.argv[i] == '--dry-run':
-            dry_run = True
-            i += 1
-        else:
-            i += 1
-
-    reorganize_models(source_dir, rules_file, output_dir, dry_run)
-
+    parser = argparse.ArgumentParser(
+        description='模型文件夹重排程序：根据合并规则JSON文件，将多个原始模型文件夹合并到新的目标文件夹中',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+示例:
+  # 在新目录中输出重排结果（推荐，源文件完全保留）
+  python3 reorganize_models.py ./sd1.5 ./merge_rules.json --output ./sd1.5_organized
+
+  # 在源目录中输出，但保留原始文件
+  python3 reorganize_models.py ./sd1.5 ./merge_rules.json
+
+  # Dry run 模式
+  python3 reorganize_models.py ./sd1.5 ./merge_rules.json --dry-run
+        '''
+    )
+
+    parser.add_argument(
+        'source_dir',
+        help='源目录路径（如 ./sd1.5）'
+    )
+
+    parser.add_argument(
+        'rules_file',
+        help='合并规则JSON文件路径（如 ./merge_rules.json）'
+    )
+
+    parser.add_argument(
+        '--output',
+        default=None,
+        help='输出目录。指定时，重排结果将放在此目录，源文件保持不动；'
+             '不指定时，使用源目录本身（仍然保留原始文件，使用复制模式）'
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='仅显示将要执行的操作，不实际执行'
+    )
+
+    parser.add_argument(
+        '--copy-engine',
+        choices=COPY_ENGINES,
+        default='auto',
+        help=f'文件复制方式（默认: auto，当前平台为 {AUTO_COPY_ENGINE}）'
+    )
+
+    args = parser.parse_args()
+
+    set_copy_engine(args.copy_engine)
+    reorganize_models(args.source_dir, args.rules_file, args.output, args.dry_run)
 
 if __name__ == '__main__':
     main()
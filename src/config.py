@@ -1,10 +1,15 @@
 import os
+from functools import lru_cache
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(DATA_DIR, "db.sqlite3")
 INDEX_PATH = os.path.join(DATA_DIR, "vector.index")
+# Exact (flat) indexes are saved as a plain .npy matrix so they can be memory-mapped
+FLAT_INDEX_PATH = os.path.join(DATA_DIR, "vector.index.npy")
+# Raw float32 feature matrix; row (image_id - 1) holds that image's vector
+FEATURES_PATH = os.path.join(DATA_DIR, "features.f32")
 
 
 # Model
@@ -15,5 +20,20 @@ FEATURE_DIM = 768
 # Processing
 BATCH_SIZE = 128
 
-# Ensure data directory exists
-os.makedirs(DATA_DIR, exist_ok=True)
+# Search index
+# Optional HNSW index (build-index --hnsw) for collections larger than this; smaller ones stay exact
+HNSW_MIN_VECTORS = 50000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = 64
+# Optional OPQ+IVF+PQ FastScan index (build-index --ivfpq); smaller collections stay exact
+IVFPQ_MIN_VECTORS = 10000
+IVFPQ_NPROBE = 16
+
+
+@lru_cache(maxsize=None)
+def ensure_data_dir():
+    """Create the data directory on first use instead of at import time."""
+    if not os.path.isdir(DATA_DIR):
+        os.makedirs(DATA_DIR, exist_ok=True)
+    return DATA_DIR
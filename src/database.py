@@ -1,46 +1,167 @@
+import atexit
+import os
 import sqlite3
-from typing import List, Tuple
-from src.config import DB_PATH
+import threading
+import numpy as np
+from typing import List, Optional, Tuple
+from src.config import DB_PATH, FEATURES_PATH, FEATURE_DIM, ensure_data_dir
+
+# One connection per thread, opened on first use and reused for every call.
+# sqlite3 keeps its own prepared-statement cache per connection.
+_local = threading.local()
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+)
 
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    """Return this thread's shared connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        ensure_data_dir()
+        conn = sqlite3.connect(DB_PATH)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+    return conn
+
+def flush():
+    """Commit any open transaction on this thread's connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.commit()
+
+def close_connection():
+    """Commit and close this thread's connection (checkpoints the WAL)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.commit()
+        conn.close()
+        _local.conn = None
+
+atexit.register(close_connection)
+
+# Feature vectors live outside SQLite in FEATURES_PATH: one fixed-size float32
+# row per image id, so the whole matrix can be memory-mapped instead of read
+# back row by row as BLOBs.
+FEATURE_ROW_BYTES = FEATURE_DIM * np.dtype(np.float32).itemsize
+
+# Most rows a single pwritev may take (the usual IOV_MAX)
+MAX_WRITE_ROWS = 1024
+
+def _write_features(features_data: List[Tuple[int, bytes]]):
+    """
+    Write (image_id, vector) rows at their offsets in the features file.
+    
+    vector can be any buffer of FEATURE_ROW_BYTES bytes (bytes, memoryview or
+    a float32 array row). Rows with consecutive ids are written with a single
+    pwritev, without joining them into one bytes object first.
+    
+    Raises ValueError, before anything is written, if a vector has a different
+    size (e.g. a model whose feature dimension is not FEATURE_DIM): it would
+    overwrite the neighbouring rows.
+    """
+    for image_id, vector in features_data:
+        size = memoryview(vector).nbytes
+        if size != FEATURE_ROW_BYTES:
+            raise ValueError(f"Feature vector for image {image_id} is {size} bytes, expected "
+                             f"{FEATURE_ROW_BYTES} ({FEATURE_DIM} float32 values)")
+    
+    ensure_data_dir()
+    fd = os.open(FEATURES_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        run_start = 0
+        run = []
+        for image_id, vector in features_data:
+            if run and image_id == run_start + len(run) and len(run) < MAX_WRITE_ROWS:
+                run.append(vector)
+                continue
+            if run:
+                os.pwritev(fd, run, (run_start - 1) * FEATURE_ROW_BYTES)
+            run_start = image_id
+            run = [vector]
+        if run:
+            os.pwritev(fd, run, (run_start - 1) * FEATURE_ROW_BYTES)
+    finally:
+        os.close(fd)
+
+def _load_feature_matrix() -> Optional[np.ndarray]:
+    """Memory-map the features file as an (rows, FEATURE_DIM) float32 matrix."""
+    if not os.path.exists(FEATURES_PATH) or os.path.getsize(FEATURES_PATH) < FEATURE_ROW_BYTES:
+        return None
+    rows = os.path.getsize(FEATURES_PATH) // FEATURE_ROW_BYTES
+    return np.memmap(FEATURES_PATH, dtype=np.float32, mode='r', shape=(rows, FEATURE_DIM))
+
+def _export_legacy_features(conn):
+    """
+    Copy vectors from the old SQLite features table into the features file.
+    
+    Vectors that are not exactly FEATURE_ROW_BYTES long (another model or
+    dimension, or a truncated blob) would overwrite neighbouring rows, so they
+    are skipped. Their images, and processed images that never had a features
+    row, are set back to pending for re-extraction (otherwise they would be
+    indexed with an all-zero vector).
+    """
+    if os.path.exists(FEATURES_PATH):
+        return
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'features'"
+    ).fetchone()
+    if not has_table:
+        return
+    invalid_ids = []
+    cursor = conn.execute("SELECT image_id, vector FROM features ORDER BY image_id ASC")
+    while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+            break
+        valid_rows = []
+        for image_id, vector in rows:
+            if vector is not None and len(vector) == FEATURE_ROW_BYTES:
+                valid_rows.append((image_id, vector))
+            else:
+                invalid_ids.append(image_id)
+        _write_features(valid_rows)
+    
+    if invalid_ids:
+        print(f"Warning: skipped {len(invalid_ids)} legacy feature vectors that are not "
+              f"{FEATURE_ROW_BYTES} bytes; their images will be processed again")
+    with conn:
+        conn.executemany("UPDATE images SET status = 0 WHERE id = ?",
+                         [(image_id,) for image_id in invalid_ids])
+        missing = conn.execute(
+            "UPDATE images SET status = 0 "
+            "WHERE status = 1 AND id NOT IN (SELECT image_id FROM features)"
+        ).rowcount
+    if missing:
+        print(f"Warning: {missing} processed images had no legacy feature vector; "
+              f"they will be processed again")
 
 def init_db():
     """Initialize the database schema."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            path TEXT UNIQUE NOT NULL,
-            status INTEGER DEFAULT 0
-        )
-    """)
-    # 0=Pending, 1=Processed, 2=Failed
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS features (
-            image_id INTEGER PRIMARY KEY,
-            vector BLOB NOT NULL,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(image_id) REFERENCES images(id)
-        )
-    """)
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                status INTEGER DEFAULT 0
+            )
+        """)
+        # 0=Pending, 1=Processed, 2=Failed
     
-    conn.commit()
-    conn.close()
+    # Databases created before the features file existed kept vectors in a table
+    _export_legacy_features(conn)
 
 def insert_image(path: str) -> bool:
     """Insert a new image path. Returns True if inserted, False if already exists."""
     conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT OR IGNORE INTO images (path) VALUES (?)", (path,))
-        inserted = cursor.rowcount > 0
-        conn.commit()
-        return inserted
-    finally:
-        conn.close()
+    with conn:
+        cursor = conn.execute("INSERT OR IGNORE INTO images (path) VALUES (?)", (path,))
+        return cursor.rowcount > 0
 
 def insert_images_batch(paths: List[str]) -> int:
     """
@@ -51,99 +172,115 @@ def insert_images_batch(paths: List[str]) -> int:
         return 0
     
     conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.executemany("INSERT OR IGNORE INTO images (path) VALUES (?)", [(p,) for p in paths])
-        inserted = cursor.rowcount
-        conn.commit()
-        return inserted
-    finally:
-        conn.close()
+    with conn:
+        cursor = conn.executemany("INSERT OR IGNORE INTO images (path) VALUES (?)", [(p,) for p in paths])
+        return cursor.rowcount
 
 def get_pending_images(limit: int = 32) -> List[Tuple[int, str]]:
     """Get a batch of pending images (status=0)."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, path FROM images WHERE status = 0 ORDER BY id ASC LIMIT ?", (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    cursor = conn.execute("SELECT id, path FROM images WHERE status = 0 ORDER BY id ASC LIMIT ?", (limit,))
+    return cursor.fetchall()
 
 def mark_as_processed(ids: List[int]):
     """Mark images as processed (status=1)."""
+    if not ids:
+        return
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.executemany("UPDATE images SET status = 1 WHERE id = ?", [(i,) for i in ids])
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.executemany("UPDATE images SET status = 1 WHERE id = ?", [(i,) for i in ids])
 
-def mark_as_failed(image_id: int):
-    """Mark image as failed (status=2)."""
+def mark_as_failed(ids: List[int]):
+    """Mark images as failed (status=2)."""
+    if not ids:
+        return
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE images SET status = 2 WHERE id = ?", (image_id,))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.executemany("UPDATE images SET status = 2 WHERE id = ?", [(i,) for i in ids])
 
 def save_feature_batch(features_data: List[Tuple[int, bytes]]):
     """
     Save a batch of features.
-    features_data: List of (image_id, vector_bytes)
+    features_data: List of (image_id, vector) where vector is a float32 buffer
     """
     if not features_data:
         return
-        
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.executemany("""
-            INSERT OR REPLACE INTO features (image_id, vector) 
-            VALUES (?, ?)
-        """, features_data)
-        conn.commit()
-    finally:
-        conn.close()
+    
+    _write_features(features_data)
 
-def get_all_features() -> Tuple[List[str], List[bytes]]:
+def save_batch_results(features_data: List[Tuple[int, bytes]], processed_ids: List[int], failed_ids: List[int]):
     """
-    Get all features and their corresponding image paths.
-    Returns (paths, vectors_bytes)
+    Save a batch's features, then update its status in a single transaction.
+    features_data: List of (image_id, vector) where vector is a float32 buffer
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    if features_data:
+        _write_features(features_data)
     
-    # Join with images table to get paths, only for valid features
-    cursor.execute("""
-        SELECT i.path, f.vector 
-        FROM features f 
-        JOIN images i ON f.image_id = i.id 
-        ORDER BY i.id ASC
-    """)
+    conn = get_connection()
+    with conn:
+        if processed_ids:
+            conn.executemany("UPDATE images SET status = 1 WHERE id = ?", [(i,) for i in processed_ids])
+        if failed_ids:
+            conn.executemany("UPDATE images SET status = 2 WHERE id = ?", [(i,) for i in failed_ids])
+
+def get_feature(image_id: int) -> Optional[np.ndarray]:
+    """Get the stored feature vector of one image, or None if it has none."""
+    matrix = _load_feature_matrix()
+    if matrix is None or not 0 < image_id <= len(matrix):
+        return None
+    return np.array(matrix[image_id - 1])
+
+def get_feature_rows() -> Tuple[List[str], np.ndarray, Optional[np.ndarray]]:
+    """
+    Get the image paths with features and where their vectors live, without
+    reading any vectors.
+    Returns (paths, matrix, rows): matrix is the memory-mapped features file and
+    rows the row index of each path in it, or None when the processed ids are
+    contiguous from 1 and path i is simply row i.
+    """
+    empty = np.empty((0, FEATURE_DIM), dtype=np.float32)
+    matrix = _load_feature_matrix()
+    if matrix is None:
+        return [], empty, None
     
+    conn = get_connection()
+    cursor = conn.execute(
+        "SELECT id, path FROM images WHERE status = 1 AND id <= ? ORDER BY id ASC",
+        (len(matrix),)
+    )
     rows = cursor.fetchall()
-    conn.close()
     
     if not rows:
-        return [], []
-        
-    paths = [r[0] for r in rows]
-    vectors = [r[1] for r in rows]
-    return paths, vectors
+        return [], empty, None
+    
+    paths = [r[1] for r in rows]
+    if rows[-1][0] == len(rows):
+        # ids 1..N are all processed: the first N mapped rows, in order
+        return paths, matrix[:len(rows)], None
+    
+    row_indices = np.fromiter((r[0] - 1 for r in rows), dtype=np.int64, count=len(rows))
+    return paths, matrix, row_indices
+
+def get_all_features() -> Tuple[List[str], np.ndarray]:
+    """
+    Get all features and their corresponding image paths.
+    Returns (paths, vectors) where vectors is a (N, FEATURE_DIM) float32 array.
+    When the processed ids are contiguous from 1, vectors is a zero-copy view of
+    the memory-mapped features file.
+    """
+    paths, matrix, rows = get_feature_rows()
+    if rows is None:
+        return paths, matrix
+    return paths, matrix[rows]
 
 def get_all_processed_paths() -> List[str]:
     """Get all processed image paths sorted by ID."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT path FROM images WHERE status = 1 ORDER BY id ASC")
-    rows = cursor.fetchall()
-    conn.close()
-    return [r[0] for r in rows]
+    cursor = conn.execute("SELECT path FROM images WHERE status = 1 ORDER BY id ASC")
+    return [r[0] for r in cursor.fetchall()]
 
 def get_stats():
     """Get database statistics."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT status, COUNT(*) FROM images GROUP BY status")
-    rows = cursor.fetchall()
-    conn.close()
-    return dict(rows)
+    cursor = conn.execute("SELECT status, COUNT(*) FROM images GROUP BY status")
+    return dict(cursor.fetchall())
@@ -0,0 +1,294 @@
+"""
+Folder sampling shared by sample_images_3000.py and sample_sd1.5_images.py.
+
+Every specific_model folder is capped at max_images: its images are streamed
+through a reservoir sampler and the files that fall out of the reservoir are
+deleted while the scan is still running, so the full file list is never held
+in memory.
+"""
+
+import os
+import sys
+import random
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Supported image formats
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif', '.tiff', '.tif', '.ico'})
+# All-lowercase / all-uppercase suffixes hit directly and skip the lower() call
+IMAGE_EXTENSIONS_ANY_CASE = IMAGE_EXTENSIONS | frozenset(ext.upper() for ext in IMAGE_EXTENSIONS)
+
+
+def is_image_name(name: str) -> bool:
+    """Check whether a file name has a supported image suffix."""
+    dot = name.rfind('.')
+    if dot <= 0:
+        return False
+    suffix = name[dot:]
+    return suffix in IMAGE_EXTENSIONS_ANY_CASE or suffix.lower() in IMAGE_EXTENSIONS
+
+
+def iter_image_files(directory: str, with_size: bool = False) -> Iterator[Tuple[str, int]]:
+    """
+    Recursively yield image files under a directory using an os.scandir stack.
+    Unreadable subdirectories are skipped.
+
+    Each directory listing is read completely before any of its files are
+    yielded, so callers may delete yielded files (sample_and_delete does)
+    without removing entries from a directory that is still being read.
+
+    Yields (path, size). The size comes from the DirEntry stat taken during the
+    scan when with_size is True, otherwise it is 0 and no stat is issued.
+    """
+    stack = [str(directory)]
+
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        files = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif is_image_name(entry.name) and entry.is_file():
+                    files.append((entry.path, entry.stat().st_size if with_size else 0))
+            except OSError:
+                continue
+        yield from files
+
+
+def format_size(size_bytes: float) -> str:
+    """Format a byte count for display."""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} TB"
+
+
+def _list_subdirs(path: Path) -> List[Path]:
+    return sorted([d for d in path.iterdir() if d.is_dir()])
+
+
+def scan(root_dir: str, base_model: Optional[str] = None) -> Tuple[List[Tuple[str, Path]], List[str]]:
+    """
+    Find the specific_model folders to sample.
+
+    Without base_model, every root_dir/<base_model>/<specific_model> folder is
+    returned, skipping base models that contain a single folder. With
+    base_model, every folder under root_dir/<base_model> is returned.
+    Invalid roots print an error and exit.
+
+    Returns ([(label, folder_path)], errors)
+    """
+    root_path = Path(root_dir)
+
+    if not root_path.exists():
+        print(f"错误：目录不存在：{root_dir}")
+        sys.exit(1)
+
+    if not root_path.is_dir():
+        print(f"错误：不是目录：{root_dir}")
+        sys.exit(1)
+
+    folders = []
+    errors = []
+
+    if base_model is not None:
+        base_model_dir = root_path / base_model
+
+        if not base_model_dir.exists():
+            print(f"❌ 错误：找不到 base_model 目录：{base_model_dir}")
+            print(f"\n可用的 base_model：")
+            try:
+                available = [d.name for d in root_path.iterdir() if d.is_dir()]
+                if available:
+                    for model in sorted(available):
+                        print(f"  - {model}")
+                else:
+                    print("  （无）")
+            except:
+                pass
+            sys.exit(1)
+
+        try:
+            specific_models = _list_subdirs(base_model_dir)
+        except PermissionError:
+            print(f"❌ 错误：无权限访问 {base_model_dir}")
+            sys.exit(1)
+
+        for specific_model_dir in specific_models:
+            folders.append((specific_model_dir.name, specific_model_dir))
+        return folders, errors
+
+    try:
+        base_models = _list_subdirs(root_path)
+    except PermissionError:
+        print(f"错误：没有权限访问 {root_dir}")
+        sys.exit(1)
+
+    for base_model_dir in base_models:
+        try:
+            specific_models = _list_subdirs(base_model_dir)
+        except PermissionError:
+            errors.append(f"无权限访问: {base_model_dir}")
+            continue
+
+        # Base models with only one folder are left untouched
+        if len(specific_models) <= 1:
+            continue
+
+        for specific_model_dir in specific_models:
+            folders.append((f"{base_model_dir.name}/{specific_model_dir.name}", specific_model_dir))
+
+    return folders, errors
+
+
+def sample_and_delete(entries: Iterator[Tuple[str, int]], max_images: int, rng: random.Random,
+                      dry_run: bool = False) -> Tuple[int, int, int, List[str]]:
+    """
+    Keep a uniform random sample of max_images entries and delete the rest.
+
+    Entries are consumed lazily; once the reservoir is full each new entry
+    either replaces a random reservoir slot or is deleted directly, and the
+    evicted entry is deleted on the spot.
+
+    Returns (num_images, delete_count, freed_size, errors)
+    """
+    reservoir = []
+    num_images = 0
+    delete_count = 0
+    freed_size = 0
+    errors = []
+
+    for entry in entries:
+        num_images += 1
+        if len(reservoir) < max_images:
+            reservoir.append(entry)
+            continue
+
+        slot = int(rng.random() * num_images)
+        if slot < max_images:
+            reservoir[slot], entry = entry, reservoir[slot]
+
+        file_to_delete, file_size = entry
+        try:
+            if not dry_run:
+                os.unlink(file_to_delete)
+            freed_size += file_size
+            delete_count += 1
+        except Exception as e:
+            errors.append(f"删除失败: {file_to_delete} - {e}")
+
+    return num_images, delete_count, freed_size, errors
+
+
+def sample_folders(root_dir: str, base_model: Optional[str] = None, max_images: int = 3000,
+                   dry_run: bool = False, with_size: bool = False) -> Dict:
+    """
+    Cap every specific_model folder found by scan() at max_images images.
+
+    Args:
+        root_dir: Root directory containing the base_model folders
+        base_model: Only sample folders under this base model (default: all)
+        max_images: Maximum number of images kept per folder
+        dry_run: Only report what would be deleted
+        with_size: Also measure the space freed (one stat per scanned file)
+
+    Returns:
+        dict: Processing statistics
+    """
+    folders, errors = scan(root_dir, base_model)
+
+    stats = {
+        'total_folders': 0,
+        'folders_over_limit': 0,
+        'images_deleted': 0,
+        'total_images_before': 0,
+        'total_images_after': 0,
+        'space_freed': 0 if with_size else None,
+        'errors': errors
+    }
+
+    print(f"{'='*80}")
+    if base_model is not None:
+        print(f"采样脚本：限制 '{base_model}' 下的每个子文件夹最多 {max_images} 张图片")
+    else:
+        print(f"开始处理图片文件夹 (最大限制: {max_images} 张)")
+        print(f"根目录: {root_dir}")
+    print(f"{'='*80}\n")
+
+    if dry_run:
+        print("【干运行模式】 - 仅显示将要删除的文件，不实际删除\n")
+
+    if not folders:
+        if base_model is not None:
+            print(f"⚠️  警告：'{base_model}' 下没有子文件夹")
+        else:
+            print(f"警告：{root_dir} 中没有找到需要处理的子文件夹")
+        return stats
+
+    print(f"发现 {len(folders)} 个子文件夹（specific_model）\n")
+    print(f"{'='*80}\n")
+
+    # One generator shared by all folders: reproducible, yet every folder gets its own draws
+    rng = random.Random(42)
+
+    for label, folder_path in folders:
+        num_images, delete_count, freed_size, folder_errors = sample_and_delete(
+            iter_image_files(folder_path, with_size), max_images, rng, dry_run
+        )
+
+        stats['total_folders'] += 1
+        stats['total_images_before'] += num_images
+        stats['total_images_after'] += (num_images - delete_count)
+        stats['errors'].extend(folder_errors)
+
+        if num_images > max_images:
+            stats['folders_over_limit'] += 1
+            stats['images_deleted'] += delete_count
+
+            print(f"[处理] {label}")
+            print(f"  当前图片数: {num_images:,} > {max_images:,}")
+            print(f"  需要删除:   {num_images - max_images:,} 张图片")
+            print(f"  删除数量:   {num_images:,} → {num_images - delete_count:,}")
+            if with_size:
+                stats['space_freed'] += freed_size
+                print(f"  释放空间:   {format_size(freed_size)}")
+            print()
+
+    return stats
+
+
+def print_summary(stats: Dict, dry_run: bool = False):
+    """Print the processing summary."""
+    print(f"{'='*80}")
+    print("处理完成 - 统计摘要")
+    print(f"{'='*80}")
+    print(f"处理的子文件夹总数:   {stats['total_folders']}")
+    print(f"超过限制的子文件夹:   {stats['folders_over_limit']}")
+    print(f"删除的图片总数:       {stats['images_deleted']:,}")
+    print(f"处理前总图片数:       {stats['total_images_before']:,}")
+    print(f"处理后总图片数:       {stats['total_images_after']:,}")
+    if stats['space_freed'] is not None:
+        print(f"释放的存储空间:       {format_size(stats['space_freed'])}")
+    print(f"{'='*80}")
+
+    if stats['errors']:
+        print(f"\n出现 {len(stats['errors'])} 个错误:")
+        for error in stats['errors'][:10]:  # Show the first 10 errors
+            print(f"  - {error}")
+        if len(stats['errors']) > 10:
+            print(f"  ... 还有 {len(stats['errors']) - 10} 个错误")
+
+    if dry_run:
+        print("\n【干运行模式】 上述操作未被实际执行")
+    else:
+        print("\n✓ 操作已完成")
+
+    print(f"{'='*80}\n")
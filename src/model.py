@@ -1,3 +1,4 @@
+from functools import lru_cache
 import torch
 import timm
 from torch.utils.data import Dataset, DataLoader
@@ -8,36 +9,57 @@ import numpy as np
 from src.config import MODEL_NAME, BATCH_SIZE
 
 
+def load_image(path, draft_size=None):
+    """
+    Open an image as RGB.
+    
+    For JPEGs, draft_size lets libjpeg decode at a reduced DCT scale that is
+    still at least draft_size on each side, instead of decoding full resolution
+    only for the transform to downscale it.
+    """
+    img = Image.open(path)
+    if draft_size:
+        img.draft('RGB', (draft_size, draft_size))
+    return img.convert('RGB')
+
+
 class ImageDataset(Dataset):
-    """PyTorch Dataset for loading images."""
+    """
+    PyTorch Dataset for loading images.
     
-    def __init__(self, image_paths, transform):
+    Images are validated lazily: unreadable files come back as a None tensor
+    and are dropped by collate_valid.
+    """
+    
+    def __init__(self, image_paths, transform, draft_size=None):
         self.image_paths = image_paths
         self.transform = transform
-        self.valid_indices = []
-        self.processed_paths = []
-        
-        # Pre-validate images
-        for i, path in enumerate(image_paths):
-            try:
-                img = Image.open(path).convert('RGB')
-                self.valid_indices.append(i)
-                self.processed_paths.append(path)
-            except Exception as e:
-                pass
+        self.draft_size = draft_size
     
     def __len__(self):
-        return len(self.valid_indices)
+        return len(self.image_paths)
     
     def __getitem__(self, idx):
-        original_idx = self.valid_indices[idx]
-        path = self.image_paths[original_idx]
+        path = self.image_paths[idx]
         try:
-            img = Image.open(path).convert('RGB')
+            img = load_image(path, self.draft_size)
             tensor = self.transform(img)
-            return tensor, original_idx, path
+            return tensor, idx, path
         except Exception as e:
-            return None, original_idx, path
+            return None, idx, path
+
+
+def collate_valid(batch):
+    """
+    Collate ImageDataset items, dropping images that failed to load.
+    Returns (stacked tensors or None, indices, paths) for the valid items.
+    """
+    batch = [item for item in batch if item[0] is not None]
+    if not batch:
+        return None, [], []
+    
+    tensors, indices, paths = zip(*batch)
+    return torch.stack(tensors), list(indices), list(paths)
 
 
 class FeatureExtractor:
@@ -57,10 +79,17 @@ class FeatureExtractor:
         # Get data config and create transform using timm's built-in configuration
         config = resolve_data_config({}, model=self.model)
         self.transform = create_transform(**config)
+        # Decode JPEGs at no less than twice the model input size; the transform resizes from there
+        self.draft_size = 2 * config['input_size'][-1]
+
+        # Mixed precision on GPU: bf16 where supported, otherwise fp16
+        self.amp_dtype = None
+        if self.device.type == 'cuda':
+            self.amp_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
 
     def preprocess(self, image_path):
         try:
-            img = Image.open(image_path).convert('RGB')
+            img = load_image(image_path, self.draft_size)
             return self.transform(img)
         except Exception as e:
             return None
@@ -87,53 +116,101 @@ class FeatureExtractor:
         batch = torch.stack(tensors).to(self.device)
         
         with torch.no_grad():
-            features = self.model(batch)
-            # L2 Normalize
-            features = torch.nn.functional.normalize(features, p=2, dim=1)
+            features = self._embed(batch)
             
         return features.cpu().numpy(), valid_indices
 
+    def _embed(self, batch):
+        """Run the model on a device batch (autocast on GPU) and L2-normalize in float32."""
+        if self.amp_dtype is not None:
+            with torch.autocast(device_type='cuda', dtype=self.amp_dtype):
+                features = self.model(batch)
+        else:
+            features = self.model(batch)
+        # L2 Normalize
+        return torch.nn.functional.normalize(features.float(), p=2, dim=1)
+
     def extract_batch(self, image_paths, batch_size=None):
         """
         Extract features for a large batch of images using DataLoader.
         More efficient than extract() for large batches.
         
+        On GPU, each batch's features are copied into a pinned host buffer
+        asynchronously and only read back after the next batch has been
+        launched, so the device-to-host copy overlaps with compute.
+        
         Returns:
             results: list of tuples (image_path, feature_vector)
         """
         if batch_size is None:
             batch_size = BATCH_SIZE
         
-        dataset = ImageDataset(image_paths, self.transform)
+        dataset = ImageDataset(image_paths, self.transform, self.draft_size)
         
         if len(dataset) == 0:
             return []
         
         # Use multiple workers for faster data loading
-        num_workers = 4 if self.device.type == 'cuda' else 2
+        use_cuda = self.device.type == 'cuda'
+        num_workers = 4 if use_cuda else 2
         dataloader = DataLoader(
             dataset,
             batch_size=batch_size,
             shuffle=False,
             num_workers=num_workers,
-            pin_memory=True if self.device.type == 'cuda' else False
+            pin_memory=use_cuda,
+            prefetch_factor=4,
+            collate_fn=collate_valid
         )
         
         results = []
+        # Two pinned buffers: one is read back while the other is being filled
+        staging = [None, None]
+        slot = 0
+        pending = None
         
         with torch.no_grad():
-            for batch_tensors, indices, paths in dataloader:
-                # Filter out None values
-                valid_mask = [t is not None for t in batch_tensors]
-                valid_indices = [i for i, valid in enumerate(valid_mask) if valid]
-                valid_paths = [p for p, valid in zip(paths, valid_mask) if valid]
+            for batch_tensors, indices, valid_paths in dataloader:
+                # Every image in this batch failed to load
+                if batch_tensors is None:
+                    continue
 
-                batch = batch_tensors.to(self.device)
-                features = self.model(batch)
-                features = torch.nn.functional.normalize(features, p=2, dim=1)
-                features_np = features.cpu().numpy()
+                batch = batch_tensors.to(self.device, non_blocking=use_cuda)
+                features = self._embed(batch)
+                
+                if not use_cuda:
+                    results.extend(zip(valid_paths, features.numpy()))
+                    continue
                 
-                for path, feature in zip(valid_paths, features_np):
-                    results.append((path, feature))
+                buffer = staging[slot]
+                if buffer is None or len(buffer) < len(features):
+                    buffer = staging[slot] = torch.empty(features.shape, dtype=features.dtype, pin_memory=True)
+                host = buffer[:len(features)]
+                host.copy_(features, non_blocking=True)
+                done = torch.cuda.Event()
+                done.record()
+                slot = 1 - slot
+                
+                # Read back the previous batch while this one is computed and copied
+                if pending is not None:
+                    self._collect(pending, results)
+                pending = (done, host, valid_paths)
+        
+        if pending is not None:
+            self._collect(pending, results)
         
         return results
+
+    @staticmethod
+    def _collect(pending, results):
+        """Wait for an async feature copy and append its (path, feature) pairs."""
+        done, host, paths = pending
+        done.synchronize()
+        # Copy out of the staging buffer, which is reused two batches later
+        results.extend(zip(paths, host.numpy().copy()))
+
+
+@lru_cache(maxsize=1)
+def get_feature_extractor():
+    """Return the process-wide FeatureExtractor, loading the model on first use."""
+    return FeatureExtractor()
@@ -1,11 +1,11 @@
 import os
 import numpy as np
 from src.config import BATCH_SIZE
-from src.database import get_pending_images, mark_as_processed, mark_as_failed, save_feature_batch
-from src.model import FeatureExtractor
+from src.database import get_pending_images, mark_as_failed, save_batch_results
+from src.model import get_feature_extractor
 
 def process_images():
-    extractor = FeatureExtractor()
+    extractor = get_feature_extractor()
     
     while True:
         # Fetch batch
@@ -24,43 +24,33 @@ def process_images():
         
         if features is None:
             # All failed
-            for i in ids:
-                mark_as_failed(i)
+            mark_as_failed(ids)
             continue
             
         # Identify successful and failed IDs
         successful_ids = []
         failed_ids = []
-        features_data = [] # List of (id, bytes)
+        features_data = [] # List of (id, feature row)
         
         # Map back to original IDs
         # valid_indices contains indices in the 'paths' list that succeeded
         valid_set = set(valid_indices)
         
         # features is a numpy array of shape (num_valid, feature_dim)
+        features = np.ascontiguousarray(features, dtype=np.float32)
         # We need to map the j-th valid feature to the correct ID
         feature_idx = 0
         
         for i in range(len(ids)):
             if i in valid_set:
                 successful_ids.append(ids[i])
-                # Get the corresponding feature vector
-                vector = features[feature_idx]
-                features_data.append((ids[i], vector.tobytes()))
+                # Rows of the contiguous float32 array are written directly, no per-row bytes copy
+                features_data.append((ids[i], features[feature_idx]))
                 feature_idx += 1
             else:
                 failed_ids.append(ids[i])
         
-        # Save features to DB
-        if features_data:
-            save_feature_batch(features_data)
-            
-        # Update database status
-        if successful_ids:
-            mark_as_processed(successful_ids)
-        
-        if failed_ids:
-            for i in failed_ids:
-                mark_as_failed(i)
+        # Save features and update status in one transaction
+        save_batch_results(features_data, successful_ids, failed_ids)
                 
         print(f"Batch complete. {len(successful_ids)} succeeded, {len(failed_ids)} failed.")
@@ -1,31 +1,74 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List, Tuple
 from src.database import insert_images_batch
 
 VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+# str.endswith takes a tuple: one C call per file instead of splitext + set lookup
+VALID_EXTENSIONS_TUPLE = tuple(sorted(VALID_EXTENSIONS))
 BATCH_SIZE = 100000
+# Directory listings run in parallel; scandir releases the GIL while waiting on the filesystem
+SCAN_WORKERS = 16
 
-def scan_directory(root_dir: str):
+def _scan_dir(path: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    List one directory with os.scandir.
+    
+    Returns (subdirectories, [(name, path)] of files). File types come from the
+    directory entries without a stat per file. Like os.walk, symlinked
+    directories are not descended into; unreadable directories return nothing.
+    """
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif not entry.is_dir():
+                    files.append((entry.name, entry.path))
+    except OSError:
+        pass
+    return subdirs, files
+
+def _walk_files(root_dir: str, num_workers: int = SCAN_WORKERS) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (name, path) for every file under root_dir.
+    
+    Each directory is listed by a thread pool worker and its subdirectories are
+    submitted as soon as the listing returns, so listings on high-latency
+    filesystems (NFS, network mounts) overlap instead of running one by one.
+    """
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = {executor.submit(_scan_dir, root_dir)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, files = future.result()
+                pending.update(executor.submit(_scan_dir, d) for d in subdirs)
+                yield from files
+
+def scan_directory(root_dir: str, num_workers: int = SCAN_WORKERS):
     """
     Recursively scan directory and add new images to the database.
+    Directories are listed by num_workers threads; database inserts stay on
+    the calling thread.
     Returns the number of new images added.
     """
     new_count = 0
     batch = []
     print(f"Scanning {root_dir}...")
     
-    for root, _, files in os.walk(root_dir):
-        for file in files:
-            ext = os.path.splitext(file)[1].lower()
-            if ext in VALID_EXTENSIONS:
-                full_path = os.path.join(root, file)
-                batch.append(full_path)
-                
-                # Insert batch when it reaches BATCH_SIZE
-                if len(batch) >= BATCH_SIZE:
-                    inserted = insert_images_batch(batch)
-                    new_count += inserted
-                    print(f"Processed {new_count} new images...")
-                    batch = []
+    for file, full_path in _walk_files(root_dir, num_workers):
+        if file.lower().endswith(VALID_EXTENSIONS_TUPLE):
+            batch.append(full_path)
+            
+            # Insert batch when it reaches BATCH_SIZE
+            if len(batch) >= BATCH_SIZE:
+                inserted = insert_images_batch(batch)
+                new_count += inserted
+                print(f"Processed {new_count} new images...")
+                batch = []
     
     # Insert remaining images
     if batch:
@@ -1,31 +1,128 @@
 import os
+import json
 import pickle
+import warnings
 import numpy as np
 import faiss
+import torch
 from typing import List, Tuple, Optional, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from src.config import INDEX_PATH, DATA_DIR, FEATURE_DIM
-from src.database import get_all_features
-from src.model import FeatureExtractor
+from src.config import (INDEX_PATH, FLAT_INDEX_PATH, FEATURE_DIM, HNSW_MIN_VECTORS, HNSW_M,
+                        HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVFPQ_MIN_VECTORS,
+                        IVFPQ_NPROBE, ensure_data_dir)
+from src.database import get_feature_rows
+from src.model import get_feature_extractor
+
+# Queries per index.search call: large enough for FAISS to run a batched GEMM,
+# small enough to bound the (chunk, k) result buffers
+SEARCH_CHUNK_SIZE = 4096
+# Below this many queries the GPU's launch and transfer overhead outweighs its speed
+GPU_MIN_QUERIES = 32
+# Cap on the (queries, database) score matrix of the torch flat search, in floats
+TORCH_SCORE_BLOCK = 64 * 1024 * 1024
+# Database rows per torch flat search tile; the running top-k is merged after each tile
+TORCH_DB_TILE = 8192
+# Rows per index.add call when building a FAISS index from the features file
+BUILD_CHUNK_SIZE = 65536
+# Scalar quantizers for build_index(quantize=...): 8-bit codes (4x smaller) or fp16 (2x, near-lossless)
+SCALAR_QUANTIZERS = {
+    'sq8': faiss.ScalarQuantizer.QT_8bit,
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+}
+
+# Image paths sidecar: a JSON array, element i is index row i (JSON escapes
+# newlines and undecodable bytes, so any file name round-trips)
+PATHS_FILE = INDEX_PATH + ".paths.json"
+LEGACY_PATHS_FILE = INDEX_PATH + ".paths.pkl"
+
+
+class FlatVectors:
+    """
+    Exact inner-product index over an external float32 matrix.
+    
+    Unlike IndexFlatIP, add() keeps a reference instead of copying, so a
+    memory-mapped feature matrix is searched in place and only paged in on use.
+    Exposes the parts of the FAISS index interface SearchEngine relies on.
+    """
+    
+    is_trained = True
+    
+    def __init__(self, d: int):
+        self.d = d
+        self.vectors = np.empty((0, d), dtype=np.float32)
+    
+    @property
+    def ntotal(self) -> int:
+        return len(self.vectors)
+    
+    def add(self, vectors: np.ndarray):
+        if self.ntotal == 0:
+            self.vectors = vectors
+        else:
+            self.vectors = np.concatenate([self.vectors, vectors])
+    
+    def search(self, query_vectors: np.ndarray, k: int):
+        return faiss.knn(query_vectors, self.vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
 
 
 class SearchEngine:
     """FAISS-based image retrieval search engine."""
     
-    def __init__(self):
-        """Initialize the search engine. Attempts to load existing index."""
+    def __init__(self, hnsw_m: int = HNSW_M, ef_search: int = HNSW_EF_SEARCH,
+                 hnsw_min_vectors: int = HNSW_MIN_VECTORS, num_threads: Optional[int] = None,
+                 use_gpu: Optional[bool] = None, nprobe: int = IVFPQ_NPROBE):
+        """
+        Initialize the search engine. Attempts to load existing index.
+        
+        Args:
+            hnsw_m: Neighbors per node when an HNSW index is built
+            ef_search: HNSW search depth (higher = better recall, slower)
+            hnsw_min_vectors: With build_index(hnsw=True), build HNSW instead of an exact
+                              flat index above this many vectors
+            num_threads: Threads used by FAISS and by the torch flat search (default: all CPUs)
+            use_gpu: Search batches of GPU_MIN_QUERIES+ queries on a GPU copy of the
+                     index (default: when a GPU build of FAISS sees a GPU)
+            nprobe: Inverted lists visited per query by an IVF-PQ index
+        """
+        faiss.omp_set_num_threads(num_threads or os.cpu_count() or 1)
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        # Flat search only takes the batched BLAS (GEMM) path above this many
+        # queries (default 20); use it for every multi-row search_by_vectors chunk
+        faiss.cvar.distance_compute_blas_threshold = 1
+        
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.hnsw_min_vectors = hnsw_min_vectors
+        self.nprobe = nprobe
+        self.use_gpu = faiss.get_num_gpus() > 0 if use_gpu is None else use_gpu
         self.index = None
+        self.gpu_index = None
+        self._gpu_copy_tried = False
+        self._db_tensor = None
         self.image_paths = []
+        self._path_to_idx = None
+        self._paths_array = None
         self.feature_extractor = None
         
         # Try to load existing index
-        if os.path.exists(INDEX_PATH):
+        if os.path.exists(FLAT_INDEX_PATH) or os.path.exists(INDEX_PATH):
             self.load_index()
     
-    def build_index(self):
-        """Build FAISS index from database features."""
+    def build_index(self, quantize: Optional[str] = None, ivfpq: bool = False, hnsw: bool = False):
+        """
+        Build FAISS index from database features.
+        
+        Args:
+            quantize: Store vectors in the index as scalar-quantized codes, one of
+                      SCALAR_QUANTIZERS: 'sq8' (4x smaller, slightly approximate
+                      scores) or 'fp16' (2x smaller)
+            ivfpq: Build an OPQ+IVF+PQ index (sublinear search, ~100x smaller,
+                   approximate) once there are IVFPQ_MIN_VECTORS vectors
+            hnsw: Build an approximate HNSW index once there are more than
+                  hnsw_min_vectors vectors (default: exact search)
+        """
         print("Loading features from database...")
-        paths, vectors_bytes = get_all_features()
+        paths, matrix, rows = get_feature_rows()
         
         if not paths:
             print("No features found in database. Please process images first.")
@@ -33,65 +130,216 @@ class SearchEngine:
         
         print(f"Found {len(paths)} processed images.")
         
-        # Convert bytes back to numpy arrays
-        vectors = []
-        for vec_bytes in vectors_bytes:
-            vec = np.frombuffer(vec_bytes, dtype=np.float32)
-            vectors.append(vec)
+        num_vectors, dim = len(paths), matrix.shape[1]
         
-        vectors = np.array(vectors, dtype=np.float32)
+        def take(positions):
+            """Read the vectors of the given path positions (a slice or an index array)."""
+            return matrix[positions] if rows is None else matrix[rows[positions]]
         
         # Verify dimensions
-        if vectors.shape[1] != FEATURE_DIM:
-            print(f"Warning: Feature dimension mismatch. Expected {FEATURE_DIM}, got {vectors.shape[1]}")
+        if dim != FEATURE_DIM:
+            print(f"Warning: Feature dimension mismatch. Expected {FEATURE_DIM}, got {dim}")
         
-        print(f"Building FAISS index with {len(vectors)} vectors of dimension {vectors.shape[1]}...")
+        print(f"Building FAISS index with {num_vectors} vectors of dimension {dim}...")
         
         # Create FAISS index
-        # Using IndexFlatIP for exact inner product search (equivalent to cosine similarity for normalized vectors)
-        self.index = faiss.IndexFlatIP(vectors.shape[1])
-        self.index.add(vectors)
+        self.index = self._create_index(dim, num_vectors, quantize, ivfpq, hnsw)
+        if isinstance(self.index, FlatVectors):
+            # Searched in place: a view of the mapped file when the rows are contiguous
+            self.index.add(take(slice(None)))
+        else:
+            if not self.index.is_trained:
+                # Quantizers (SQ ranges, IVF centroids, PQ codebooks) are learned first
+                self.index.train(take(self._training_rows(num_vectors)))
+            # Stream the features file in chunks; the index keeps its own copy
+            for start in range(0, num_vectors, BUILD_CHUNK_SIZE):
+                self.index.add(np.ascontiguousarray(take(slice(start, start + BUILD_CHUNK_SIZE))))
+        self._db_tensor = None
+        self._apply_search_params()
+        self._reset_gpu_index()
         
         self.image_paths = paths
+        self._path_to_idx = None
+        self._paths_array = None
         
         print(f"Index built successfully. Total vectors: {self.index.ntotal}")
         return True
     
+    def _create_index(self, dim: int, num_vectors: int, quantize: Optional[str] = None,
+                      ivfpq: bool = False, hnsw: bool = False):
+        """
+        Create an empty inner-product index sized for num_vectors.
+        
+        By default this is FlatVectors for exact inner product search (equivalent
+        to cosine similarity for normalized vectors) directly on the feature matrix,
+        without copying it into FAISS. With hnsw, collections of more than
+        hnsw_min_vectors use HNSW, which is approximate but avoids scanning every
+        vector on each query. With quantize, both store scalar-quantized codes
+        (8-bit or fp16) instead of float32. With
+        ivfpq, collections of at least IVFPQ_MIN_VECTORS get OPQ64,IVF{nlist},PQ64x4fs
+        with nlist ~ 4 * sqrt(N): 4-bit PQ codes in the FastScan layout, which
+        scores blocks of codes with SIMD table lookups (32 bytes per vector).
+        """
+        if ivfpq and num_vectors >= IVFPQ_MIN_VECTORS:
+            nlist = int(4 * np.sqrt(num_vectors))
+            factory = f"OPQ64,IVF{nlist},PQ64x4fs"
+            print(f"Using {factory} index (nprobe={self.nprobe})")
+            return faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+        if ivfpq:
+            print(f"Fewer than {IVFPQ_MIN_VECTORS} vectors, building an exact index instead of IVF-PQ")
+        
+        if hnsw and num_vectors <= self.hnsw_min_vectors:
+            print(f"At most {self.hnsw_min_vectors} vectors, building an exact index instead of HNSW")
+        if not hnsw or num_vectors <= self.hnsw_min_vectors:
+            if quantize:
+                print(f"Using {quantize} scalar quantized index")
+                return faiss.IndexScalarQuantizer(dim, SCALAR_QUANTIZERS[quantize], faiss.METRIC_INNER_PRODUCT)
+            print("Using exact flat index")
+            return FlatVectors(dim)
+        
+        print(f"Using HNSW index (M={self.hnsw_m}, efSearch={self.ef_search}{', ' + quantize if quantize else ''})")
+        if quantize:
+            index = faiss.IndexHNSWSQ(dim, SCALAR_QUANTIZERS[quantize], self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = self.ef_search
+        return index
+    
+    @staticmethod
+    def _training_rows(num_vectors: int, max_rows: int = 256 * 1024):
+        """
+        Positions of a random subset of rows (in file order) for training quantizers
+        on large collections; capped so the copy stays under ~1 GB at FEATURE_DIM=768.
+        """
+        if num_vectors <= max_rows:
+            return slice(None)
+        rng = np.random.default_rng(42)
+        return np.sort(rng.choice(num_vectors, size=max_rows, replace=False))
+    
+    def _apply_search_params(self):
+        """Set query-time parameters (HNSW efSearch, IVF nprobe) on a CPU index."""
+        if isinstance(self.index, FlatVectors):
+            return
+        if isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = self.ef_search
+        try:
+            faiss.extract_index_ivf(self.index).nprobe = self.nprobe
+        except RuntimeError:
+            pass  # not an IVF index
+    
+    def _reset_gpu_index(self):
+        """Drop the GPU copy of a replaced index; the next large batch makes a new one."""
+        self.gpu_index = None
+        self._gpu_copy_tried = False
+    
+    def _copy_to_gpu(self):
+        """
+        Copy the index to all visible GPUs if enabled. self.index stays the CPU
+        index, used for small query batches and for saving.
+        
+        Called on the first batch of GPU_MIN_QUERIES+ queries rather than on
+        load, so single-query searches never pay for the upload (a FlatVectors
+        matrix would otherwise be read in full from its memory map).
+        """
+        self.gpu_index = None
+        self._gpu_copy_tried = True
+        if not self.use_gpu or self.index is None:
+            return
+        
+        try:
+            index = self.index
+            if isinstance(index, FlatVectors):
+                # Uploaded through a temporary FAISS flat index
+                index = faiss.IndexFlatIP(index.d)
+                index.add(self.index.vectors)
+            self.gpu_index = faiss.index_cpu_to_all_gpus(index)
+            print(f"Index copied to {faiss.get_num_gpus()} GPU(s)")
+        except Exception as e:
+            # HNSW and some quantized indexes have no GPU implementation
+            print(f"Keeping index on CPU: {e}")
+    
+    def _warmup(self):
+        """
+        Run one throwaway search so the OpenMP/BLAS thread pools are started
+        at load time instead of on the first real query.
+        """
+        query = np.zeros((1, self.index.d), dtype=np.float32)
+        if isinstance(self.index, FlatVectors) or type(self.index) is faiss.IndexFlatIP:
+            # A flat scan would page in the whole matrix; a small GEMM starts the same pools
+            with torch.no_grad():
+                torch.mm(torch.from_numpy(query), torch.zeros(self.index.d, 64))
+        elif self.index.ntotal > 0:
+            self.index.search(query, 1)
+    
     def save_index(self):
         """Save FAISS index and image paths to disk."""
         if self.index is None:
             print("No index to save. Build index first.")
             return False
         
-        # Save FAISS index
-        faiss.write_index(self.index, INDEX_PATH)
-        
-        # Save image paths mapping
-        paths_file = INDEX_PATH + ".paths.pkl"
-        with open(paths_file, 'wb') as f:
-            pickle.dump(self.image_paths, f)
-        
-        print(f"Index saved to {INDEX_PATH}")
+        ensure_data_dir()
+        
+        # Save index; flat indexes as a plain matrix that load_index can memory-map
+        if isinstance(self.index, FlatVectors):
+            index_file, stale_file = FLAT_INDEX_PATH, INDEX_PATH
+            np.save(FLAT_INDEX_PATH, np.ascontiguousarray(self.index.vectors, dtype=np.float32))
+        else:
+            index_file, stale_file = INDEX_PATH, FLAT_INDEX_PATH
+            faiss.write_index(self.index, INDEX_PATH)
+        if os.path.exists(stale_file):
+            os.remove(stale_file)
+        
+        # Save image paths mapping in index order
+        paths_file = PATHS_FILE
+        with open(paths_file, 'w', encoding='ascii') as f:
+            json.dump(self.image_paths, f)
+        if os.path.exists(LEGACY_PATHS_FILE):
+            os.remove(LEGACY_PATHS_FILE)
+        
+        print(f"Index saved to {index_file}")
         print(f"Paths mapping saved to {paths_file}")
         return True
     
     def load_index(self):
         """Load FAISS index and image paths from disk."""
-        if not os.path.exists(INDEX_PATH):
+        if not os.path.exists(FLAT_INDEX_PATH) and not os.path.exists(INDEX_PATH):
             print(f"Index file not found: {INDEX_PATH}")
             return False
         
-        paths_file = INDEX_PATH + ".paths.pkl"
+        paths_file = PATHS_FILE if os.path.exists(PATHS_FILE) else LEGACY_PATHS_FILE
         if not os.path.exists(paths_file):
-            print(f"Paths mapping file not found: {paths_file}")
+            print(f"Paths mapping file not found: {PATHS_FILE}")
             return False
         
-        # Load FAISS index
-        self.index = faiss.read_index(INDEX_PATH)
-        
-        # Load image paths
-        with open(paths_file, 'rb') as f:
-            self.image_paths = pickle.load(f)
+        # Load index; flat matrices stay memory-mapped and are paged in on search
+        if os.path.exists(FLAT_INDEX_PATH):
+            vectors = np.load(FLAT_INDEX_PATH, mmap_mode='r')
+            self.index = FlatVectors(vectors.shape[1])
+            self.index.add(vectors)
+        else:
+            self.index = faiss.read_index(INDEX_PATH)
+        self._db_tensor = None
+        self._apply_search_params()
+        self._reset_gpu_index()
+        
+        # Load image paths; indexes saved before the JSON format still have a pickle
+        if paths_file == PATHS_FILE:
+            with open(paths_file, 'r', encoding='ascii') as f:
+                self.image_paths = json.load(f)
+        else:
+            with open(paths_file, 'rb') as f:
+                self.image_paths = pickle.load(f)
+        if len(self.image_paths) != self.index.ntotal:
+            print(f"Paths mapping has {len(self.image_paths)} entries but the index has "
+                  f"{self.index.ntotal} vectors; rebuild the index")
+            self.index = None
+            self._reset_gpu_index()
+            self.image_paths = []
+            return False
+        self._path_to_idx = None
+        self._paths_array = None
+        self._warmup()
         
         print(f"Index loaded successfully. Total vectors: {self.index.ntotal}")
         return True
@@ -101,7 +349,7 @@ class SearchEngine:
         Search for similar images using a feature vector.
         
         Args:
-            query_vector: Feature vector to search for (must be normalized)
+            query_vector: Feature vector to search for (L2-normalized before searching)
             k: Number of results to return
             
         Returns:
@@ -114,21 +362,120 @@ class SearchEngine:
         if query_vector.ndim == 1:
             query_vector = query_vector.reshape(1, -1)
         
-        # Ensure float32 type for FAISS
-        query_vector = query_vector.astype(np.float32)
+        return self.search_by_vectors(query_vector[:1], k)[0]
+    
+    def search_by_vectors(self, query_vectors: np.ndarray, k: int = 10,
+                          chunk_size: int = SEARCH_CHUNK_SIZE) -> List[List[Tuple[str, float]]]:
+        """
+        Search for similar images for many feature vectors at once.
+        
+        Queries are sent to FAISS in chunks of chunk_size rows, so each call is a
+        single batched search instead of one search per vector.
+        
+        Args:
+            query_vectors: Array of shape (n, feature_dim); rows are L2-normalized here
+            k: Number of results to return per query
+            chunk_size: Number of queries per FAISS search call
+            
+        Returns:
+            List of n result lists, each of (image_path, similarity_score) tuples
+            sorted by similarity (highest first)
+        """
+        if self.index is None:
+            return [[] for _ in range(len(query_vectors))]
+        
+        # FAISS needs a C-contiguous float32 matrix; copy so the caller's array is
+        # left untouched, then L2-normalize the whole batch in one call
+        query_vectors = np.array(query_vectors, dtype=np.float32, order='C')
+        faiss.normalize_L2(query_vectors)
         
-        # Search
         k = min(k, self.index.ntotal)  # Don't request more results than we have
-        distances, indices = self.index.search(query_vector, k)
+        num_paths = len(self.image_paths)
+        if self._paths_array is None:
+            self._paths_array = np.empty(num_paths, dtype=object)
+            self._paths_array[:] = self.image_paths
+        
+        # Large batches go to the GPU copy; a handful of queries is faster on CPU
+        if self.use_gpu and len(query_vectors) >= GPU_MIN_QUERIES and not self._gpu_copy_tried:
+            self._copy_to_gpu()
+        if self.gpu_index is not None and len(query_vectors) >= GPU_MIN_QUERIES:
+            chunks = self._faiss_search(self.gpu_index, query_vectors, k, chunk_size)
+        elif isinstance(self.index, FlatVectors) or type(self.index) is faiss.IndexFlatIP:
+            chunks = self._torch_flat_search(query_vectors, k)
+        else:
+            chunks = self._faiss_search(self.index, query_vectors, k, chunk_size)
         
-        # Build results
         results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx < len(self.image_paths):
-                results.append((self.image_paths[idx], float(dist)))
+        for distances, indices in chunks:
+            # FAISS pads missing results with -1; gather all paths at once, then
+            # filter only the rows that actually contain padding
+            valid = (indices >= 0) & (indices < num_paths)
+            paths = self._paths_array[np.where(valid, indices, 0)]
+            for dist_row, path_row, valid_row, full in zip(distances.tolist(), paths.tolist(),
+                                                             valid.tolist(), valid.all(axis=1).tolist()):
+                if full:
+                    results.append(list(zip(path_row, dist_row)))
+                else:
+                    results.append([(p, d) for p, d, ok in zip(path_row, dist_row, valid_row) if ok])
         
         return results
     
+    @staticmethod
+    def _faiss_search(index, query_vectors: np.ndarray, k: int, chunk_size: int):
+        """Yield (distances, indices) from index.search over chunks of queries."""
+        for start in range(0, len(query_vectors), chunk_size):
+            yield index.search(query_vectors[start:start + chunk_size], k)
+    
+    def _torch_flat_search(self, query_vectors: np.ndarray, k: int):
+        """
+        Exact inner-product search over a flat index using torch.mm + torch.topk.
+        
+        The database is a zero-copy view of the FlatVectors matrix (or of an
+        IndexFlatIP's storage for indexes saved by older versions). Queries are
+        scanned in tiles of TORCH_DB_TILE rows, keeping a running top-k per query,
+        so a tile stays cache-resident and the full (queries, database) score matrix
+        is never materialized. Queries are processed in blocks so each tile's score
+        matrix stays under TORCH_SCORE_BLOCK floats.
+        Yields (distances, indices) like _faiss_search.
+        """
+        if self._db_tensor is None:
+            if isinstance(self.index, FlatVectors):
+                db = self.index.vectors
+            else:
+                ntotal, dim = self.index.ntotal, self.index.d
+                db = faiss.rev_swig_ptr(self.index.get_xb(), ntotal * dim).reshape(ntotal, dim)
+            with warnings.catch_warnings():
+                # Read-only memory maps are fine: the tensor is never written
+                warnings.simplefilter("ignore", UserWarning)
+                self._db_tensor = torch.from_numpy(db)
+        
+        ntotal = self.index.ntotal
+        if ntotal == 0 or k <= 0:
+            # Nothing to scan: one empty result row per query
+            yield (np.empty((len(query_vectors), 0), dtype=np.float32),
+                   np.empty((len(query_vectors), 0), dtype=np.int64))
+            return
+        tile = max(1, min(ntotal, TORCH_DB_TILE))
+        block = max(1, TORCH_SCORE_BLOCK // tile)
+        with torch.no_grad():
+            for start in range(0, len(query_vectors), block):
+                queries = torch.from_numpy(query_vectors[start:start + block])
+                values = indices = None
+                for offset in range(0, ntotal, tile):
+                    scores = torch.mm(queries, self._db_tensor[offset:offset + tile].T)
+                    tile_values, tile_indices = torch.topk(scores, min(k, scores.shape[1]), dim=1)
+                    tile_indices += offset
+                    if values is None:
+                        values, indices = tile_values, tile_indices
+                        continue
+                    # Merge this tile's candidates into the running top-k (fewer
+                    # than k columns until k rows have been scanned)
+                    values = torch.cat([values, tile_values], dim=1)
+                    indices = torch.cat([indices, tile_indices], dim=1)
+                    values, order = torch.topk(values, min(k, values.shape[1]), dim=1)
+                    indices = torch.gather(indices, 1, order)
+                yield values.numpy(), indices.numpy()
+    
     def search(self, query_image_path: str, k: int = 10) -> List[Tuple[str, float]]:
         """
         Search for similar images using a query image.
@@ -143,9 +490,14 @@ class SearchEngine:
         if self.index is None:
             return []
         
+        # Images already in the index are searched with their stored vector
+        query_vector = self._indexed_vector(query_image_path)
+        if query_vector is not None:
+            return self.search_by_vector(query_vector, k)
+        
         # Initialize feature extractor if needed
         if self.feature_extractor is None:
-            self.feature_extractor = FeatureExtractor()
+            self.feature_extractor = get_feature_extractor()
         
         # Extract feature for query image
         features, valid_indices = self.feature_extractor.extract([query_image_path])
@@ -158,21 +510,41 @@ class SearchEngine:
         # Search using the vector
         return self.search_by_vector(query_vector, k)
     
-    def _search_single(self, query_vector: np.ndarray, k: int) -> List[Tuple[str, float]]:
-        """Helper method for single search (used by search_batch with threading)."""
-        return self.search_by_vector(query_vector, k)
+    def _indexed_vector(self, image_path: str) -> Optional[np.ndarray]:
+        """
+        Return the vector stored in the index for image_path, or None if the
+        image is not indexed or the index cannot reconstruct it (e.g. IVF).
+        Quantized indexes return their decoded, approximate vector.
+        """
+        if self._path_to_idx is None:
+            self._path_to_idx = {p: i for i, p in enumerate(self.image_paths)}
+        
+        idx = self._path_to_idx.get(image_path)
+        if idx is None:
+            idx = self._path_to_idx.get(os.path.abspath(image_path))
+        if idx is None or idx >= self.index.ntotal:
+            return None
+        
+        if isinstance(self.index, FlatVectors):
+            return np.array(self.index.vectors[idx])
+        try:
+            return self.index.reconstruct(idx)
+        except RuntimeError:
+            return None
     
     def search_batch(self, image_paths: List[str], k: int = 10, batch_size: int = 128, 
-                     num_threads: int = 8) -> Dict[str, List[Tuple[str, float]]]:
+                     num_threads: Optional[int] = None) -> Dict[str, List[Tuple[str, float]]]:
         """
         Search for similar images using a batch of query images.
-        Uses DataLoader for efficient feature extraction and multi-threading for FAISS search.
+        Images already in the index reuse their stored vectors; the rest go through
+        DataLoader feature extraction. All queries then run as a single batched
+        search (parallelized by FAISS's OpenMP threads, or torch's for flat indexes).
         
         Args:
             image_paths: List of image paths to search
             k: Number of results to return per image
             batch_size: Batch size for feature extraction
-            num_threads: Number of threads for parallel FAISS search
+            num_threads: Search threads for FAISS and torch (default: keep the engine setting)
             
         Returns:
             Dict mapping image_path -> list of (matched_image_path, similarity_score) tuples
@@ -180,47 +552,42 @@ class SearchEngine:
         if self.index is None:
             return {}
         
-        # Initialize feature extractor if needed
-        if self.feature_extractor is None:
-            self.feature_extractor = FeatureExtractor()
-        
-        # Extract features in batches using DataLoader
-        print(f"Extracting features for {len(image_paths)} images...")
-        extracted_results = self.feature_extractor.extract_batch(image_paths, batch_size=batch_size)
+        # Images already in the index are searched with their stored vectors
+        paths, queries, to_extract = [], [], []
+        for path in image_paths:
+            vector = self._indexed_vector(path)
+            if vector is None:
+                to_extract.append(path)
+            else:
+                paths.append(path)
+                queries.append(vector)
+        
+        if to_extract:
+            # Initialize feature extractor if needed
+            if self.feature_extractor is None:
+                self.feature_extractor = get_feature_extractor()
+            
+            # Extract features in batches using DataLoader
+            print(f"Extracting features for {len(to_extract)} images...")
+            extracted_results = self.feature_extractor.extract_batch(to_extract, batch_size=batch_size)
+            print(f"Successfully extracted {len(extracted_results)} features")
+            for path, feature in extracted_results:
+                paths.append(path)
+                queries.append(feature)
         
-        if not extracted_results:
+        if not paths:
             print("Failed to extract features from any images")
             return {}
         
-        print(f"Successfully extracted {len(extracted_results)} features")
-        
-        # Prepare search tasks
-        search_tasks = [(path, feature) for path, feature in extracted_results]
+        if num_threads:
+            faiss.omp_set_num_threads(num_threads)
+            torch.set_num_threads(num_threads)
         
-        # Use thread pool for parallel FAISS search
-        results = {}
-        print(f"Searching with {num_threads} threads...")
+        # One (B, D) query matrix, searched in a single batched call
+        queries = np.stack(queries)
         
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            # Submit all search tasks
-            future_to_path = {
-                executor.submit(self._search_single, feature, k): path 
-                for path, feature in search_tasks
-            }
-            
-            # Process completed tasks
-            completed = 0
-            for future in as_completed(future_to_path):
-                path = future_to_path[future]
-                try:
-                    search_results = future.result()
-                    results[path] = search_results
-                    completed += 1
-                    if completed % 50 == 0:
-                        print(f"  Completed {completed}/{len(search_tasks)} searches")
-                except Exception as e:
-                    print(f"Error searching for {path}: {e}")
-                    results[path] = []
+        print(f"Searching {len(paths)} queries...")
+        results = dict(zip(paths, self.search_by_vectors(queries, k)))
         
         print(f"✓ Search complete: {len(results)} results")
         return results
@@ -0,0 +1,64 @@
+"""
+Drawing helpers shared by the visualization scripts (test_retrieval_visual.py,
+visualize_duplicates.py and visualize_real_fake_pairs.py).
+"""
+
+from functools import lru_cache
+from typing import Tuple
+from PIL import Image, ImageFont
+
+
+# Tried when the requested font is missing (the scripts name macOS fonts);
+# DejaVu Sans is installed on most Linux distributions
+FALLBACK_FONTS = ("DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+
+@lru_cache(maxsize=16)
+def get_font(path: str, size: int):
+    """
+    Load a TrueType font once per (path, size).
+
+    Falls back to DejaVu Sans, then to Pillow's built-in font at the same size
+    (Pillow >= 10.1), so labels keep their size on hosts without the font.
+    """
+    for candidate in (path,) + FALLBACK_FONTS:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1 has no sized default font
+        return ImageFont.load_default()
+
+
+def load_thumbnail(image_path: str, max_size: Tuple[int, int]) -> Image.Image:
+    """
+    Open an image as an RGB thumbnail that fits in max_size.
+
+    JPEGs decode at a reduced DCT scale that is still at least twice max_size,
+    large reductions go through an integer box filter before the final LANCZOS
+    step, and real transparency is flattened onto white. Errors are raised to
+    the caller, which decides how to report them.
+    """
+    img = Image.open(image_path)
+    # JPEGs decode straight at a reduced DCT scale, still at least 2x max_size
+    img.draft('RGB', (max_size[0] * 2, max_size[1] * 2))
+
+    # Large reductions: shrink by an integer box filter first (much cheaper than
+    # LANCZOS and done before the alpha composite), LANCZOS only does the last step
+    ratio = max(img.width / max_size[0], img.height / max_size[1])
+    if ratio >= 3 and img.mode in ('RGB', 'RGBA', 'L', 'LA'):
+        img = img.reduce(int(ratio))
+
+    # Flatten real transparency onto white; everything else is a plain convert
+    if img.mode in ('RGBA', 'LA') and img.getextrema()[-1][0] < 255:
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.getchannel('A'))
+        img = rgb_img
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # Resize to max_size while maintaining aspect ratio
+    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return img
@@ -8,13 +8,23 @@ This script:
 """
 
 import os
+import hashlib
 import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from src.config import DATA_DIR
 from src.database import get_all_processed_paths
 from src.search import SearchEngine
+from src.visual import get_font, load_thumbnail
+
+# Rendered grid thumbnails, reused across runs while the source file is unchanged
+THUMB_CACHE_DIR = os.path.join(DATA_DIR, "thumbs")
+# Most recently used thumbnails kept in THUMB_CACHE_DIR (~50 KB each at 150x150)
+THUMB_CACHE_MAX_FILES = 20000
 
 
 def remove_duplicate_results(results, similarity_threshold=0.98):
@@ -54,17 +64,48 @@ def remove_duplicate_results(results, similarity_threshold=0.98):
     return filtered_results
 
 
+def _render_thumbnail(image_path, target_size):
+    """Decode an image and fit it, centered on white, into target_size."""
+    img = load_thumbnail(image_path, target_size)
+    if img.size == tuple(target_size):  # already fills the cell, nothing to pad
+        return img
+    
+    # Create a new image with white background
+    result = Image.new('RGB', target_size, (255, 255, 255))
+    # Center the thumbnail
+    offset = ((target_size[0] - img.size[0]) // 2, (target_size[1] - img.size[1]) // 2)
+    result.paste(img, offset)
+    return result
+
+
 def load_and_resize_image(image_path, target_size=(150, 150)):
-    """Load and resize an image to target size."""
+    """
+    Load and resize an image to target size.
+    
+    Thumbnails are cached losslessly (PNG) in THUMB_CACHE_DIR, keyed by path,
+    mtime, size and target size, so unchanged images are not decoded again on
+    later runs and render exactly as they would uncached.
+    """
     try:
-        img = Image.open(image_path).convert('RGB')
-        img.thumbnail(target_size, Image.Resampling.LANCZOS)
+        st = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}|{tuple(target_size)}"
+        cache_path = os.path.join(THUMB_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.png')
+        try:
+            cached = Image.open(cache_path).convert('RGB')
+            os.utime(cache_path)  # mark as recently used for _prune_thumb_cache
+            return cached
+        except OSError:
+            pass
         
-        # Create a new image with white background
-        result = Image.new('RGB', target_size, (255, 255, 255))
-        # Center the thumbnail
-        offset = ((target_size[0] - img.size[0]) // 2, (target_size[1] - img.size[1]) // 2)
-        result.paste(img, offset)
+        result = _render_thumbnail(image_path, target_size)
+        try:
+            os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+            # Write under a temporary name so a concurrent run never reads a partial file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            result.save(tmp_path, 'PNG', compress_level=1)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # The cache is an optimization; a read-only data dir is fine
         return result
     except Exception as e:
         print(f"Error loading {image_path}: {e}")
@@ -73,20 +114,42 @@ def load_and_resize_image(image_path, target_size=(150, 150)):
         return result
 
 
+def _prune_thumb_cache(max_files=THUMB_CACHE_MAX_FILES):
+    """Delete the least recently used cached thumbnails beyond max_files."""
+    try:
+        with os.scandir(THUMB_CACHE_DIR) as it:
+            entries = [(entry.stat().st_mtime_ns, entry.path) for entry in it if entry.name.endswith('.png')]
+    except OSError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - max_files]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# Text measurement does not depend on the image drawn on, so one scratch surface serves all labels
+_MEASURE_DRAW = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+@lru_cache(maxsize=1024)
+def _text_size(text, font):
+    """Width and height of text in font; repeated labels ("#1", "#1 (self)", ...) are measured once."""
+    bbox = _MEASURE_DRAW.textbbox((0, 0), text, font=font)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
 def add_label(img, text, position='top', color=(0, 0, 0), bg_color=(255, 255, 255)):
     """Add a text label to an image."""
     draw = ImageDraw.Draw(img)
     
-    # Try to use a nice font, fall back to default if not available
-    try:
-        font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 12)
-    except:
-        font = ImageFont.load_default()
+    font = get_font("/System/Library/Fonts/Helvetica.ttc", 12)
     
     # Get text size
-    bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
+    text_width, text_height = _text_size(text, font)
     
     # Create position
     if position == 'top':
@@ -140,16 +203,28 @@ def create_retrieval_grid(query_paths, search_results, output_path, top_k=10):
     draw = ImageDraw.Draw(canvas)
     
     # Add title
-    try:
-        title_font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 20)
-    except:
-        title_font = ImageFont.load_default()
+    title_font = get_font("/System/Library/Fonts/Helvetica.ttc", 20)
     
     title = f"Image Retrieval Test: {n_queries} Queries × Top-{top_k} Results"
     title_bbox = draw.textbbox((0, 0), title, font=title_font)
     title_width = title_bbox[2] - title_bbox[0]
     draw.text(((canvas_width - title_width) // 2, 10), title, fill=(0, 0, 0), font=title_font)
     
+    # Decode and resize every distinct image once, in parallel (Pillow releases the GIL);
+    # self-matches and results shared between queries reuse the same thumbnail
+    grid_paths = []
+    for query_path, results in zip(query_paths, search_results):
+        grid_paths.append(os.path.abspath(query_path))
+        grid_paths.extend(os.path.abspath(path) for path, _ in results[:top_k])
+    unique_paths = list(dict.fromkeys(grid_paths))
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        decoded = dict(zip(unique_paths, executor.map(
+            lambda path: load_and_resize_image(path, (img_size, img_size)), unique_paths
+        )))
+    _prune_thumb_cache()
+    # add_label draws in place, so every grid cell gets its own copy
+    thumbnails = ((path, decoded[path].copy()) for path in grid_paths)
+    
     # Process each query
     for query_idx, (query_path, results) in enumerate(zip(query_paths, search_results)):
         # Calculate y position for this row
@@ -157,7 +232,7 @@ def create_retrieval_grid(query_paths, search_results, output_path, top_k=10):
         
         # Load and add query image
         x_offset = 20
-        query_img = load_and_resize_image(query_path, (img_size, img_size))
+        query_abspath, query_img = next(thumbnails)
         
         # Add label for filename and id below the image
         filename = os.path.basename(query_path)
@@ -169,9 +244,9 @@ def create_retrieval_grid(query_paths, search_results, output_path, top_k=10):
                               color=(0, 0, 0), bg_color=(255, 255, 255))
         
         # Add border to query image
-        bordered_query = Image.new('RGB', (img_size + 4, img_size + 4), (0, 100, 200))
-        bordered_query.paste(query_img, (2, 2))
-        canvas.paste(bordered_query, (x_offset - 2, y_offset - 2))
+        canvas.paste(query_img, (x_offset, y_offset))
+        draw.rectangle([x_offset - 2, y_offset - 2, x_offset + img_size + 1, y_offset + img_size + 1],
+                       outline=(0, 100, 200), width=2)
         
         # Add arrow
         arrow_x = x_offset + img_size + 5
@@ -185,10 +260,10 @@ def create_retrieval_grid(query_paths, search_results, output_path, top_k=10):
         for rank, (result_path, score) in enumerate(results[:top_k]):
             x_offset = 20 + (rank + 1) * (img_size + gap) + 20  # +20 for arrow space
             
-            result_img = load_and_resize_image(result_path, (img_size, img_size))
+            result_abspath, result_img = next(thumbnails)
             
             # Check if it's the same as query (self-match)
-            is_self_match = os.path.abspath(result_path) == os.path.abspath(query_path)
+            is_self_match = result_abspath == query_abspath
             
             # Add rank and score label
             label = f"#{rank + 1}"
@@ -214,9 +289,9 @@ def create_retrieval_grid(query_paths, search_results, output_path, top_k=10):
                                   color=(50, 50, 50), bg_color=(255, 255, 255))
             
             # Add border
-            bordered_result = Image.new('RGB', (img_size + 2, img_size + 2), border_color)
-            bordered_result.paste(result_img, (1, 1))
-            canvas.paste(bordered_result, (x_offset - 1, y_offset - 1))
+            canvas.paste(result_img, (x_offset, y_offset))
+            draw.rectangle([x_offset - 1, y_offset - 1, x_offset + img_size, y_offset + img_size],
+                           outline=border_color)
     
     # Save the result
     canvas.save(output_path, quality=95)
@@ -275,11 +350,13 @@ def run_retrieval_test(n_queries=10, top_k=10, output_path="retrieval_test_resul
     
     # Perform searches
     print(f"\n4. Performing searches (top-{top_k} results per query)...")
+    # All queries in one batched search; indexed images reuse their stored vectors
+    batch_results = search_engine.search_batch(query_paths, k=top_k)
     search_results = []
     
     for i, query_path in enumerate(query_paths, 1):
-        print(f"   Searching {i}/{len(query_paths)}: {os.path.basename(query_path)}")
-        results = search_engine.search(query_path, k=top_k)
+        print(f"   Results {i}/{len(query_paths)}: {os.path.basename(query_path)}")
+        results = batch_results.get(query_path, [])
         
         # Remove duplicate results if enabled
         if remove_duplicates and results:
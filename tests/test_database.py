@@ -0,0 +1,62 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import src.database as database
+
+
+@pytest.fixture
+def db_paths(tmp_path, monkeypatch):
+    """Point the database and features file at a temporary directory."""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "images.db"))
+    monkeypatch.setattr(database, "FEATURES_PATH", str(tmp_path / "features.f32"))
+    monkeypatch.setattr(database, "ensure_data_dir", lambda: None)
+    yield tmp_path
+    database.close_connection()
+
+
+def _vector(value):
+    return np.full(database.FEATURE_DIM, value, dtype=np.float32)
+
+
+def _create_legacy_db(path, features):
+    """A database from before the features file: vectors stored as BLOBs in a table."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE images (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "path TEXT UNIQUE NOT NULL, status INTEGER DEFAULT 0)")
+    conn.execute("CREATE TABLE features (image_id INTEGER PRIMARY KEY, vector BLOB)")
+    for image_id in range(1, 6):
+        conn.execute("INSERT INTO images (path, status) VALUES (?, 1)", (f"/img/{image_id}.jpg",))
+    conn.executemany("INSERT INTO features VALUES (?, ?)", features)
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_export_resets_missing_and_malformed_vectors(db_paths):
+    _create_legacy_db(database.DB_PATH, [
+        (1, _vector(1).tobytes()),
+        (2, _vector(2).tobytes()[:100]),  # truncated blob
+        # image 3 is processed but has no features row
+        (4, _vector(4).tobytes()),
+        (5, np.ones(512, dtype=np.float32).tobytes()),  # another model's dimension
+    ])
+
+    database.init_db()
+
+    paths, vectors = database.get_all_features()
+    assert paths == ["/img/1.jpg", "/img/4.jpg"]
+    np.testing.assert_array_equal(vectors[:, 0], [1, 4])
+    statuses = dict(database.get_connection().execute("SELECT id, status FROM images").fetchall())
+    assert statuses == {1: 1, 2: 0, 3: 0, 4: 1, 5: 0}
+
+
+def test_write_features_rejects_wrong_size(db_paths):
+    database.init_db()
+    database.save_feature_batch([(1, _vector(1))])
+
+    with pytest.raises(ValueError):
+        database.save_feature_batch([(2, _vector(2)), (3, np.ones(512, dtype=np.float32))])
+
+    # Nothing from the rejected batch was written
+    assert len(database._load_feature_matrix()) == 1
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("faiss")
+
+import src.search as search
+from src.search import FlatVectors, SearchEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """A SearchEngine that does not pick up an index from the data directory."""
+    monkeypatch.setattr(search, "INDEX_PATH", str(tmp_path / "index.faiss"))
+    monkeypatch.setattr(search, "FLAT_INDEX_PATH", str(tmp_path / "index.flat.npy"))
+    return SearchEngine(use_gpu=False)
+
+
+def _use_vectors(engine, vectors):
+    engine.index = FlatVectors(vectors.shape[1])
+    engine.index.add(vectors)
+    engine.image_paths = [f"img_{i}.jpg" for i in range(len(vectors))]
+
+
+def test_torch_flat_search_k_larger_than_two_tiles(engine, monkeypatch):
+    monkeypatch.setattr(search, "TORCH_DB_TILE", 16)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100, 8)).astype(np.float32)
+    queries = rng.standard_normal((3, 8)).astype(np.float32)
+    _use_vectors(engine, vectors)
+
+    k = 70  # more than two tiles of 16 rows
+    distances, indices = next(engine._torch_flat_search(queries, k))
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    assert distances.shape == (3, k)
+    np.testing.assert_array_equal(np.sort(indices, axis=1), np.sort(expected, axis=1))
+
+
+def test_search_by_vectors_returns_every_vector(engine, monkeypatch):
+    monkeypatch.setattr(search, "TORCH_DB_TILE", 16)
+    vectors = np.random.default_rng(1).standard_normal((50, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    _use_vectors(engine, vectors)
+
+    results = engine.search_by_vectors(vectors[:2], k=1000)
+
+    assert [len(row) for row in results] == [50, 50]
+    assert results[0][0][0] == "img_0.jpg"
+
+
+def test_search_by_vectors_on_empty_index(engine):
+    _use_vectors(engine, np.empty((0, 8), dtype=np.float32))
+
+    assert engine.search_by_vectors(np.ones((2, 8), dtype=np.float32), k=5) == [[], []]
+
+
+def test_save_and_load_round_trip_unusual_paths(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(search, "PATHS_FILE", str(tmp_path / "index.faiss.paths.json"))
+    monkeypatch.setattr(search, "LEGACY_PATHS_FILE", str(tmp_path / "index.faiss.paths.pkl"))
+    monkeypatch.setattr(search, "ensure_data_dir", lambda: None)
+    vectors = np.eye(4, dtype=np.float32)
+    _use_vectors(engine, vectors)
+    engine.image_paths = ["/img/a\nb.jpg", "/img/\udcff.jpg", "/img/c d.jpg", "/img/last.jpg"]
+    assert engine.save_index()
+
+    loaded = SearchEngine(use_gpu=False)
+
+    assert loaded.image_paths == engine.image_paths
+    assert loaded.search_by_vector(vectors[3], k=1)[0][0] == "/img/last.jpg"
+
+
+def test_load_rejects_mismatched_paths(engine, tmp_path, monkeypatch):
+    paths_file = tmp_path / "index.faiss.paths.json"
+    monkeypatch.setattr(search, "PATHS_FILE", str(paths_file))
+    monkeypatch.setattr(search, "LEGACY_PATHS_FILE", str(tmp_path / "index.faiss.paths.pkl"))
+    monkeypatch.setattr(search, "ensure_data_dir", lambda: None)
+    _use_vectors(engine, np.eye(4, dtype=np.float32))
+    assert engine.save_index()
+    paths_file.write_text('["/img/only_one.jpg"]')
+
+    assert not engine.load_index()
+    assert engine.index is None
+
+
+def test_gpu_copy_is_made_on_first_large_batch(engine, monkeypatch):
+    copies = []
+    monkeypatch.setattr(search.faiss, "index_cpu_to_all_gpus", lambda index: copies.append(index) or index)
+    engine.use_gpu = True
+    _use_vectors(engine, np.eye(8, dtype=np.float32))
+    engine._reset_gpu_index()
+
+    engine.search_by_vectors(np.eye(8, dtype=np.float32)[:1], k=1)
+    assert copies == []
+
+    results = engine.search_by_vectors(np.tile(np.eye(8, dtype=np.float32), (4, 1)), k=1)
+    engine.search_by_vectors(np.tile(np.eye(8, dtype=np.float32), (4, 1)), k=1)
+    assert len(copies) == 1
+    assert results[3][0][0] == "img_3.jpg"
+
+
+def test_search_batch_sets_torch_threads(engine, monkeypatch):
+    threads = []
+    monkeypatch.setattr(search.torch, "set_num_threads", threads.append)
+    _use_vectors(engine, np.eye(4, dtype=np.float32))
+
+    results = engine.search_batch(["img_2.jpg"], k=1, num_threads=3)
+
+    assert threads == [3]
+    assert results["img_2.jpg"][0][0] == "img_2.jpg"
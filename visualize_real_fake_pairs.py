@@ -10,24 +10,62 @@ This script:
 
 import os
 import argparse
-import random
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple
-import matplotlib.pyplot as plt
-from PIL import Image
+from typing import Iterator, List, Dict, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFile
 import numpy as np
+from src.visual import get_font, load_thumbnail
 
+# Show whatever decoded from truncated files instead of failing over to the placeholder
+ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-def scan_real_directory(real_dir: str, fake_root: str) -> List[Dict]:
+# Size of each image box in the visualization
+THUMB_SIZE = (300, 300)
+# Title font; falls back to PIL's default font where it is not installed
+FONT_PATH = "/System/Library/Fonts/Helvetica.ttc"
+
+# Shown in place of images that fail to load (pasting never modifies it, so one is shared)
+_PLACEHOLDER = Image.new('RGB', THUMB_SIZE, (200, 200, 200))
+
+
+def _iter_symlinks(directory: str) -> Iterator[Tuple[str, str]]:
+    """
+    Recursively yield the symlinks under a directory using an os.scandir stack.
+    Symlinked directories are yielded but not descended into; unreadable
+    subdirectories are skipped.
+    
+    Yields (symlink_path, path relative to directory).
+    """
+    stack = [(directory, "")]
+    
+    while stack:
+        current, relative = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    relative_entry = os.path.join(relative, entry.name) if relative else entry.name
+                    if entry.is_symlink():
+                        yield entry.path, relative_entry
+                    elif entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, relative_entry))
+        except OSError:
+            continue
+
+
+def scan_real_directory(real_dir: str, fake_root: str) -> List[Tuple[str, str, str]]:
     """
     Scan real directory (containing symlinks) and build pairing list.
     
+    Pairs are kept as plain tuples; select_valid_pairs() only builds the full
+    pair dictionaries for the few pairs it selects.
+    
     Args:
         real_dir: Directory containing symlinks (output from build_fake_real_pairs.py)
         fake_root: Original fake images directory
         
     Returns:
-        List of pairing dictionaries with fake_image and real_image paths
+        List of (fake_image, real_image, model) tuples
     """
     pairs = []
     real_path = Path(real_dir)
@@ -38,44 +76,39 @@ def scan_real_directory(real_dir: str, fake_root: str) -> List[Dict]:
     if not fake_root_path.exists():
         raise ValueError(f"Fake root directory not found: {fake_root}")
     
-    # Recursively find all symlinks in real_dir
-    for symlink in real_path.rglob('*'):
-        # Check if it's a symlink
-        if not os.path.islink(str(symlink)):
+    # Symlink target -> resolved real image path (None if missing); real images
+    # shared by several fakes are resolved and checked only once
+    resolved_targets = {}
+    
+    for symlink_path, relative_symlink in _iter_symlinks(real_dir):
+        try:
+            target = os.path.join(os.path.dirname(symlink_path), os.readlink(symlink_path))
+        except OSError:
             continue
         
-        # Get the real image path that the symlink points to
-        real_image_path = os.path.realpath(str(symlink))
-        
-        # Verify the target exists
-        if not os.path.exists(real_image_path):
-            continue
+        if target in resolved_targets:
+            real_image_path = resolved_targets[target]
+        else:
+            # The link target is the real image (one readlink hop, no per-component realpath walk)
+            real_image_path = os.path.normpath(target)
+            # Verify the target exists
+            if not os.path.exists(real_image_path):
+                real_image_path = None
+            resolved_targets[target] = real_image_path
         
-        # Get the relative path of the symlink within real_dir
-        # This will be: model_name/relative_path/fake_filename
-        try:
-            relative_symlink = symlink.relative_to(real_path)
-        except ValueError:
+        if real_image_path is None:
             continue
         
         # Construct the corresponding fake image path
-        # The relative path structure should match between real_dir and fake_root
-        fake_image_path = fake_root_path / relative_symlink
+        # The relative path (model_name/relative_path/fake_filename) matches between real_dir and fake_root
+        fake_image_path = os.path.join(fake_root, relative_symlink)
         
         # Verify the fake image exists
-        if not os.path.exists(str(fake_image_path)):
+        if not os.path.exists(fake_image_path):
             continue
         
-        # Create pair entry
-        pair = {
-            "fake_image": str(fake_image_path),
-            "fake_filename": os.path.basename(str(fake_image_path)),
-            "real_image": real_image_path,
-            "real_filename": os.path.basename(real_image_path),
-            "model": relative_symlink.parts[0] if len(relative_symlink.parts) > 1 else "unknown"
-        }
-        
-        pairs.append(pair)
+        model = relative_symlink.split(os.sep, 1)[0] if os.sep in relative_symlink else "unknown"
+        pairs.append((fake_image_path, real_image_path, model))
     
     if not pairs:
         raise ValueError(f"No valid image pairs found. Check that real_dir contains symlinks "
@@ -89,96 +122,117 @@ def validate_image_path(path: str) -> bool:
     return os.path.exists(path) and os.path.isfile(path)
 
 
-def load_image(image_path: str, max_size: Tuple[int, int] = (300, 300)) -> Image.Image:
+def load_image(image_path: str, max_size: Tuple[int, int] = THUMB_SIZE) -> Image.Image:
     """Load and resize image."""
     try:
-        img = Image.open(image_path)
-        
-        # Convert RGBA to RGB if necessary
-        if img.mode in ('RGBA', 'LA', 'P'):
-            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-            rgb_img.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-            img = rgb_img
-        
-        # Resize to max_size while maintaining aspect ratio
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        return img
+        return load_thumbnail(image_path, max_size)
     except Exception as e:
         print(f"Warning: Could not load image {image_path}: {e}")
         return None
 
 
-def select_valid_pairs(pairs: List[Dict], num_pairs: int = 10) -> List[Dict]:
-    """Select pairs where both fake and real images exist."""
-    valid_pairs = []
-    for pair in pairs:
-        fake_path = pair.get("fake_image")
-        real_path = pair.get("real_image")
+def select_valid_pairs(pairs: List[Tuple[str, str, str]], num_pairs: int = 10,
+                       seed: Optional[int] = None) -> List[Dict]:
+    """
+    Randomly select up to num_pairs pairs where both fake and real images exist.
+    
+    Pairs are visited in random order and validated only until num_pairs valid
+    ones are found, so picking a few pairs from a large list costs a few checks.
+    
+    Args:
+        pairs: (fake_image, real_image, model) tuples from scan_real_directory()
+        num_pairs: Number of pairs to select
+        seed: Random seed for reproducibility (default: unseeded)
+        
+    Returns:
+        List of pairing dictionaries with fake_image and real_image paths
+    """
+    selected_pairs = []
+    # NumPy builds the random visiting order in C, far cheaper than random.sample on large lists
+    for idx in np.random.default_rng(seed).permutation(len(pairs)):
+        fake_path, real_path, model = pairs[idx]
         
-        if fake_path and real_path and validate_image_path(fake_path) and validate_image_path(real_path):
-            valid_pairs.append(pair)
+        if validate_image_path(fake_path) and validate_image_path(real_path):
+            selected_pairs.append({
+                "fake_image": fake_path,
+                "fake_filename": os.path.basename(fake_path),
+                "real_image": real_path,
+                "real_filename": os.path.basename(real_path),
+                "model": model
+            })
+            if len(selected_pairs) == num_pairs:
+                break
     
-    if len(valid_pairs) == 0:
+    if not selected_pairs:
         raise ValueError("No valid image pairs found")
     
-    # Randomly select pairs
-    selected_pairs = random.sample(valid_pairs, min(num_pairs, len(valid_pairs)))
-    
     return selected_pairs
 
 
 def create_visualization(pairs: List[Dict], output_path: str = "fake_real_pairs_visualization.jpg"):
-    """Create and save visualization of fake-real pairs."""
+    """
+    Create and save visualization of fake-real pairs.
+    
+    Each pair is one row of the image: the fake image on the left and its real
+    match on the right, each under a title, composited directly with PIL.
+    """
     num_pairs = len(pairs)
     
-    # Create figure with subplots (num_pairs rows, 2 columns)
-    fig, axes = plt.subplots(num_pairs, 2, figsize=(12, 4 * num_pairs))
+    # Layout: a title above a THUMB_SIZE box per cell, two cells per row
+    thumb_width, thumb_height = THUMB_SIZE
+    padding = 20
+    header_height = 50
+    title_height = 40
+    cell_width = thumb_width + 2 * padding
+    cell_height = title_height + thumb_height + padding
+    canvas_width = 2 * cell_width
+    canvas_height = header_height + num_pairs * cell_height
+    
+    canvas = Image.new('RGB', (canvas_width, canvas_height), (255, 255, 255))
+    draw = ImageDraw.Draw(canvas)
+    title_font = get_font(FONT_PATH, 20)
+    label_font = get_font(FONT_PATH, 12)
     
-    # Handle single pair case
-    if num_pairs == 1:
-        axes = axes.reshape(1, -1)
+    title = f"Fake-Real Image Pairs (Random Selection: {num_pairs} pairs)"
+    title_bbox = draw.textbbox((0, 0), title, font=title_font)
+    draw.text(((canvas_width - (title_bbox[2] - title_bbox[0])) // 2, padding // 2),
+              title, fill=(0, 0, 0), font=title_font)
     
-    fig.suptitle(f"Fake-Real Image Pairs (Random Selection: {num_pairs} pairs)", 
-                 fontsize=16, fontweight='bold', y=0.995)
+    # Load all images in parallel; Pillow releases the GIL while decoding and resizing
+    paths = [path for pair in pairs for path in (pair.get("fake_image"), pair.get("real_image"))]
+    with ThreadPoolExecutor(max_workers=min(16, len(paths))) as executor:
+        images = [img if img is not None else _PLACEHOLDER for img in executor.map(load_image, paths)]
     
     for idx, pair in enumerate(pairs):
         fake_path = pair.get("fake_image")
         real_path = pair.get("real_image")
+        fake_img, real_img = images[2 * idx], images[2 * idx + 1]
         
-        # Load fake image
-        fake_img = load_image(fake_path)
-        if fake_img is None:
-            fake_img = Image.new('RGB', (300, 300), (200, 200, 200))
-        
-        # Load real image
-        real_img = load_image(real_path)
-        if real_img is None:
-            real_img = Image.new('RGB', (300, 300), (200, 200, 200))
-        
-        # Display fake image (left column)
-        ax_fake = axes[idx, 0]
-        ax_fake.imshow(fake_img)
-        fake_filename = os.path.basename(fake_path)
+        fake_filename = pair.get("fake_filename") or os.path.basename(fake_path)
         fake_model = pair.get("model", "unknown")
-        ax_fake.set_title(f"Fake ({fake_model})\n{fake_filename[:30]}...", fontsize=10)
-        ax_fake.axis('off')
+        real_filename = pair.get("real_filename") or os.path.basename(real_path)
+        cells = [
+            (f"Fake ({fake_model})\n{fake_filename[:30]}...", fake_img),  # left column
+            (f"Real Match\n{real_filename[:30]}...", real_img),            # right column
+        ]
         
-        # Display real image (right column)
-        ax_real = axes[idx, 1]
-        ax_real.imshow(real_img)
-        real_filename = os.path.basename(real_path)
-        ax_real.set_title(f"Real Match\n{real_filename[:30]}...", fontsize=10)
-        ax_real.axis('off')
-    
-    plt.tight_layout()
+        y_offset = header_height + idx * cell_height
+        for col, (label, img) in enumerate(cells):
+            x_offset = col * cell_width
+            
+            # Title centered above the image
+            label_bbox = draw.multiline_textbbox((0, 0), label, font=label_font, align='center')
+            draw.multiline_text(
+                (x_offset + (cell_width - (label_bbox[2] - label_bbox[0])) // 2, y_offset + 5),
+                label, fill=(0, 0, 0), font=label_font, align='center'
+            )
+            
+            # Image centered in its box
+            canvas.paste(img, (x_offset + padding + (thumb_width - img.width) // 2,
+                               y_offset + title_height + (thumb_height - img.height) // 2))
     
-    # Save figure
-    plt.savefig(output_path, dpi=100, bbox_inches='tight')
+    canvas.save(output_path, quality=95)
     print(f"✓ Visualization saved to: {output_path}")
-    
-    # Also display the figure
-    plt.show()
 
 
 def main():
@@ -233,10 +287,6 @@ Examples:
     
     args = parser.parse_args()
     
-    # Set random seed if provided
-    if args.seed is not None:
-        random.seed(args.seed)
-    
     try:
         print("="*70)
         print("Visualizing Fake-Real Image Pairs")
@@ -251,7 +301,7 @@ Examples:
         
         # Select valid pairs
         print(f"\nSelecting {args.num_pairs} random valid pairs...")
-        selected_pairs = select_valid_pairs(all_pairs, args.num_pairs)
+        selected_pairs = select_valid_pairs(all_pairs, args.num_pairs, seed=args.seed)
         print(f"✓ Selected {len(selected_pairs)} valid pairs")
         
         if args.verbose: